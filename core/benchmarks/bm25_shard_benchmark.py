@@ -0,0 +1,80 @@
+"""
+Measure BM25 query throughput (queries/sec) as shards are added, against
+the in-process BM25Index. Scores are checked against the in-process index.
+
+    python -m benchmarks.bm25_shard_benchmark [corpus.txt] [queries]
+"""
+
+import random
+import sys
+import time
+
+from benchmarks.common import load_corpus
+from benchmarks.embedding_benchmark import worker_counts
+
+from core.utils.bm25_index import BM25Index
+from core.utils.bm25_shards import ShardedBM25Index
+from core.utils.bm25_utils import _tokenize_rows
+from utils.ColorScheme import ColorScheme
+from utils.text_properties import normalize_content
+
+cs = ColorScheme()
+
+QUERIES = 200
+TOP_K = 100
+
+
+def sample_queries(docs, count, seed=0):
+    """Two to four tokens drawn from random documents."""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        _, tokens, _ = rng.choice(docs)
+        queries.append(rng.sample(tokens, min(len(tokens), rng.randint(2, 4))))
+    return queries
+
+
+def run(name, index, queries, baseline=None):
+    start = time.perf_counter()
+    results = [index.top_scores(query, TOP_K)[0] for query in queries]
+    rate = len(queries) / (time.perf_counter() - start)
+    scaling = f"  x{rate / baseline:.2f}" if baseline else ""
+    print(f"  {name:<16} {rate:>10,.1f} queries/s{scaling}")
+    return rate, results
+
+
+def same_scores(expected, actual):
+    for a, b in zip(expected, actual):
+        common = a.keys() & b.keys()
+        if any(abs(a[doc_id] - b[doc_id]) > 1e-9 for doc_id in common):
+            return False
+    return True
+
+
+def main(path=None, query_count=QUERIES):
+    rows = [
+        (doc_id, content, language, None, None, None)
+        for doc_id, (content, language) in enumerate(load_corpus(path), start=1)
+    ]
+    docs = _tokenize_rows(rows, normalize_content)
+    if not docs:
+        print(f"{cs.RED}No documents to benchmark.{cs.RESET}")
+        return
+
+    print(f"{cs.CYAN}BM25 shard benchmark on {len(docs)} documents{cs.RESET}")
+    queries = sample_queries(docs, query_count)
+    baseline, expected = run("in-process", BM25Index(docs), queries)
+
+    for shards in worker_counts():
+        with ShardedBM25Index(normalize_content, shards) as index:
+            index.load(rows)
+            _, results = run(f"{shards} shard(s)", index, queries, baseline)
+        if not same_scores(expected, results):
+            print(f"{cs.RED}  scores differ from the in-process index{cs.RESET}")
+
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1] if len(sys.argv) > 1 else None,
+        int(sys.argv[2]) if len(sys.argv) > 2 else QUERIES,
+    )
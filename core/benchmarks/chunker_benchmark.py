@@ -0,0 +1,113 @@
+"""
+Compare `ingestion.chunker.iter_chunks` with the previous ingestion path
+(per-pattern re.sub, normalize_content, RecursiveCharacterTextSplitter,
+normalize_content again on every chunk).
+
+    python -m benchmarks.chunker_benchmark              # documents from the database
+    python -m benchmarks.chunker_benchmark file.pdf     # elements from parse_pdf()
+    python -m benchmarks.chunker_benchmark corpus.txt   # one element per line
+"""
+
+import re
+import sys
+import time
+
+from benchmarks.common import load_corpus
+
+from ingestion.chunker import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    FOOTER_PATTERNS,
+    HEADER_PATTERNS,
+    iter_chunks,
+)
+from utils.ColorScheme import ColorScheme
+from utils.text_properties import normalize_content
+
+cs = ColorScheme()
+
+ELEMENTS_PER_PAGE = 8
+REPEATS = 3
+
+
+def load_elements(path=None):
+    if path and path.lower().endswith(".pdf"):
+        from ingestion.unstructured_pdf_elements import parse_pdf
+
+        return parse_pdf(path)
+
+    return [
+        {
+            "book_id": "benchmark",
+            "page_number": i // ELEMENTS_PER_PAGE + 1,
+            "raw_text": text,
+        }
+        for i, (text, _) in enumerate(load_corpus(path))
+    ]
+
+
+def legacy_chunks(elements):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""],
+    )
+    chunks = []
+    for element in elements:
+        content = element["raw_text"].strip()
+        for pattern in HEADER_PATTERNS + FOOTER_PATTERNS:
+            content = re.sub(pattern, "", content, flags=re.MULTILINE | re.IGNORECASE)
+        content = normalize_content(content.strip())
+        if len(content) < 15:
+            continue
+        for chunk in splitter.split_text(content):
+            chunks.append(normalize_content(chunk.strip()))
+    return chunks
+
+
+def native_chunks(elements):
+    return [
+        chunk["content"]
+        for chunk in iter_chunks(
+            elements, CHUNK_SIZE, CHUNK_OVERLAP, HEADER_PATTERNS, FOOTER_PATTERNS
+        )
+    ]
+
+
+def run(name, elements, chunk_fn):
+    total_chars = sum(len(element["raw_text"]) for element in elements)
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        chunks = chunk_fn(elements)
+        best = min(best, time.perf_counter() - start)
+
+    print(
+        f"  {name:<28} {len(elements) / best:>12,.0f} elements/s  "
+        f"{total_chars / best / 1024 / 1024:>8.2f} MB/s  {len(chunks):>8,} chunks"
+    )
+    return best
+
+
+def main(path=None):
+    elements = load_elements(path)
+    if not elements:
+        print(f"{cs.RED}No elements to benchmark.{cs.RESET}")
+        return
+
+    print(f"{cs.CYAN}Chunker benchmark on {len(elements)} elements{cs.RESET}")
+    native = run("iter_chunks()", elements, native_chunks)
+    try:
+        legacy = run("RecursiveCharacterTextSplitter", elements, legacy_chunks)
+    except ImportError:
+        print(
+            f"{cs.YELLOW}langchain_text_splitters not installed, skipping legacy path{cs.RESET}"
+        )
+        return
+    print(f"{cs.GREEN}Speedup: {legacy / native:.2f}x{cs.RESET}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,82 @@
+"""
+Latency and recall of the coarse-to-fine vector search against the exact
+full-dimension query, for a range of candidate pool factors. Needs the
+database, with a projection fitted by `python -m db.vector_projection`.
+
+    python -m benchmarks.coarse_vector_benchmark [queries] [top_k]
+"""
+
+import random
+import sys
+import time
+
+from benchmarks.common import load_corpus
+
+import db.database_operations as ops
+from utils.ColorScheme import ColorScheme
+from utils.text_properties import normalize_content
+
+cs = ColorScheme()
+
+QUERIES = 100
+TOP_K = 10
+POOL_FACTORS = (2, 5, 10, 20, 50)
+
+
+def sample_queries(count, seed=0):
+    """The first words of random stored documents."""
+    rng = random.Random(seed)
+    corpus = [content for content, _ in load_corpus() if content]
+    queries = []
+    for content in rng.sample(corpus, min(count, len(corpus))):
+        words = normalize_content(content).split()
+        queries.append(" ".join(words[: rng.randint(3, 8)]))
+    return queries
+
+
+def run(vectors, top_k, coarse_factor):
+    start = time.perf_counter()
+    results = [
+        ops._semantic_search(vector, top_k, -1, {}, coarse_factor)[0]
+        for vector in vectors
+    ]
+    return (time.perf_counter() - start) / len(vectors), results
+
+
+def main(query_count=QUERIES, top_k=TOP_K):
+    if ops.connect() is None:
+        print(f"{cs.RED}No database connection.{cs.RESET}")
+        return
+    if ops.projection is None:
+        print(
+            f"{cs.RED}No coarse projection; run python -m db.vector_projection{cs.RESET}"
+        )
+        return
+    queries = sample_queries(query_count)
+    if not queries:
+        print(f"{cs.RED}No documents to benchmark.{cs.RESET}")
+        return
+
+    vectors = [ops.get_model().encode(query).tolist() for query in queries]
+    print(
+        f"{cs.CYAN}Coarse vector benchmark: {len(queries)} queries, top_k={top_k}, "
+        f"{ops.projection.method} {ops.projection.dims} dims{cs.RESET}"
+    )
+
+    exact_latency, exact = run(vectors, top_k, 0)
+    print(f"  {'exact':<12} {exact_latency * 1000:>8.1f} ms")
+    for factor in POOL_FACTORS:
+        latency, results = run(vectors, top_k, factor)
+        found = sum(len(a.keys() & b.keys()) for a, b in zip(exact, results))
+        recall = found / max(sum(len(a) for a in exact), 1)
+        print(
+            f"  {f'pool x{factor}':<12} {latency * 1000:>8.1f} ms  "
+            f"x{exact_latency / latency:.2f}  recall@{top_k} {recall:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else QUERIES,
+        int(sys.argv[2]) if len(sys.argv) > 2 else TOP_K,
+    )
@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def load_corpus(path=None):
+    """
+    Return a list of (content, language) pairs for benchmarking.
+    - `path`: text file with one document per line; defaults to the database
+    """
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [(line.strip(), None) for line in f if line.strip()]
+
+    from db.db_connection import db_connection
+
+    conn = db_connection()
+    if conn is None:
+        return []
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT content, languages FROM document")
+        rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+def deep_size(obj, seen=None):
+    """Approximate memory footprint of nested dicts/lists/strings."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
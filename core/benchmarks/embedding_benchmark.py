@@ -0,0 +1,71 @@
+"""
+Measure embedding throughput (sentences/sec) as EmbeddingService workers
+are added, against the old one-string-per-call path.
+
+    python -m benchmarks.embedding_benchmark [corpus.txt] [max_sentences]
+"""
+
+import os
+import sys
+import time
+
+from benchmarks.common import load_corpus
+
+from models.ai_model import get_embedder
+from models.embedding_service import DEFAULT_MODEL, EmbeddingService
+from utils.ColorScheme import ColorScheme
+from utils.text_properties import normalize_content
+
+cs = ColorScheme()
+
+MAX_SENTENCES = 2000
+
+
+def worker_counts():
+    cpu_count = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cpu_count:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cpu_count:
+        counts.append(cpu_count)
+    return counts
+
+
+def report(name, sentences, elapsed, baseline=None):
+    rate = len(sentences) / elapsed
+    scaling = f"  x{rate / baseline:.2f}" if baseline else ""
+    print(f"  {name:<24} {rate:>10,.1f} sentences/s{scaling}")
+    return rate
+
+
+def main(path=None, max_sentences=MAX_SENTENCES):
+    sentences = [normalize_content(content) for content, _ in load_corpus(path)]
+    sentences = [s for s in sentences if s][:max_sentences]
+    if not sentences:
+        print(f"{cs.RED}No sentences to benchmark.{cs.RESET}")
+        return
+
+    print(f"{cs.CYAN}Embedding benchmark on {len(sentences)} sentences{cs.RESET}")
+
+    model = get_embedder(DEFAULT_MODEL)
+    start = time.perf_counter()
+    for sentence in sentences:
+        model.encode(sentence)
+    baseline = report("one per call", sentences, time.perf_counter() - start)
+    del model
+
+    for workers in worker_counts():
+        with EmbeddingService(num_workers=workers) as service:
+            # Time encoding only, not the replicas loading in the background
+            service.wait_ready()
+            start = time.perf_counter()
+            service.encode(sentences)
+            elapsed = time.perf_counter() - start
+        report(f"{workers} worker(s)", sentences, elapsed, baseline)
+
+
+if __name__ == "__main__":
+    main(
+        sys.argv[1] if len(sys.argv) > 1 else None,
+        int(sys.argv[2]) if len(sys.argv) > 2 else MAX_SENTENCES,
+    )
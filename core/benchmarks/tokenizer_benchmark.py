@@ -0,0 +1,79 @@
+"""
+Compare the old whitespace tokenizer with `utils.tokenizer.tokenize`.
+
+Reports tokens/sec, vocabulary size and BM25 index memory for both.
+
+    python -m benchmarks.tokenizer_benchmark              # corpus from the database
+    python -m benchmarks.tokenizer_benchmark corpus.txt   # one document per line
+"""
+
+import sys
+import time
+
+from benchmarks.common import deep_size, load_corpus
+
+from utils.bm25_index import BM25Index
+from utils.ColorScheme import ColorScheme
+from utils.text_properties import normalize_content
+from utils.tokenizer import tokenize
+
+cs = ColorScheme()
+
+
+def index_size(index):
+    # sys.getsizeof(array) includes its buffer, so deep_size covers postings
+    segments = sum(
+        deep_size(segment.postings) + deep_size(segment.doc_len)
+        for segment in index.segments
+    )
+    return segments + deep_size(index.idf)
+
+
+def run(name, corpus, tokenizer_fn):
+    start = time.perf_counter()
+    tokenized = [tokenizer_fn(content, language) for content, language in corpus]
+    elapsed = time.perf_counter() - start
+
+    tokenized = [tokens for tokens in tokenized if tokens]
+    total_tokens = sum(len(tokens) for tokens in tokenized)
+    vocabulary = {token for tokens in tokenized for token in tokens}
+    index = BM25Index([(i, tokens, {}) for i, tokens in enumerate(tokenized)])
+
+    stats = {
+        "tokens_per_sec": total_tokens / elapsed if elapsed > 0 else 0,
+        "tokens": total_tokens,
+        "vocabulary": len(vocabulary),
+        "index_bytes": index_size(index),
+    }
+    print(
+        f"  {name:<12} {stats['tokens_per_sec']:>14,.0f} tok/s  "
+        f"{stats['tokens']:>10,} tokens  {stats['vocabulary']:>8,} terms  "
+        f"{stats['index_bytes'] / 1024 / 1024:>8.2f} MB"
+    )
+    return stats
+
+
+def main(path=None):
+    corpus = load_corpus(path)
+    if not corpus:
+        print(f"{cs.RED}No documents to benchmark.{cs.RESET}")
+        return
+
+    print(f"{cs.CYAN}Tokenizer benchmark on {len(corpus)} documents{cs.RESET}")
+    old = run("split()", corpus, lambda text, _: normalize_content(text).split())
+    new = run(
+        "tokenize()",
+        corpus,
+        lambda text, language: tokenize(text, language, remove_stopwords=True),
+    )
+
+    vocab_change = (new["vocabulary"] - old["vocabulary"]) / max(old["vocabulary"], 1)
+    memory_change = (new["index_bytes"] - old["index_bytes"]) / max(
+        old["index_bytes"], 1
+    )
+    print(f"{cs.GREEN}Vocabulary size change: {vocab_change:+.1%}{cs.RESET}")
+    print(f"{cs.GREEN}Index memory change:    {memory_change:+.1%}{cs.RESET}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,44 @@
+"""
+Run many queries headlessly and write one JSON line per query.
+
+    python bulk_search.py queries.txt --top-k 10 > results.jsonl
+    cat queries.txt | python bulk_search.py - --filters '{"language": "fa"}'
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Ensure the parent directory is in sys.path for relative imports
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from db.database_operations import DEFAULT_THRESHOLD, DEFAULT_TOP_K, search
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("queries", help="file with one query per line, or - for stdin")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--filters", type=json.loads, default=None, help="JSON object")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stream = sys.stdin if args.queries == "-" else open(args.queries, encoding="utf-8")
+    with stream:
+        for line in stream:
+            query = line.strip()
+            if query:
+                search(
+                    query,
+                    top_k=args.top_k,
+                    threshold=args.threshold,
+                    filters=args.filters,
+                    output="jsonl",
+                )
+
+
+if __name__ == "__main__":
+    main()
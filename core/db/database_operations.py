@@ -1,3 +1,5 @@
+import heapq
+import math
 import os
 import sys
 import time
@@ -5,29 +7,106 @@ import time
 # Ensure the parent directory is in sys.path for relative imports
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from db.db_connection import db_connection
+from db.schema import ensure_schema
+from db.vector_projection import (
+    COARSE_DIMS,
+    fit_coarse_projection,
+    load_projection,
+    projection_fitted_at,
+    vector_literal,
+)
 from models.ai_model import get_embedder
 from utils.text_properties import normalize_content
+from utils.tokenizer import tokenize
 
 # from utils.bm25_utils import update_bm25_index, bm25_index, bm25_corpus
 import utils.bm25_utils as bm25_utils
+from utils.bm25_index import normalize_filters
+from utils import minhash
 
 from core.utils.rich_console import display_results
+from utils.jsonl_output import write_jsonl
 from utils.helper_functions import check_if_empty_input
 from utils.languages import detect_language
 from utils.ColorScheme import ColorScheme
 
 cs = ColorScheme()
 
-# Connect to DB
-conn = db_connection()
-cursor = conn.cursor() if conn else None
-model = get_embedder("paraphrase-multilingual-MiniLM-L12-v2")
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# The search connection and the model are set up on first use (connect(),
+# get_model()), not at import: EmbeddingService's spawn workers re-import
+# the caller's __main__ and must not each open a connection or load a model.
+conn = None
+cursor = None
+model = None
+# Coarse-vector projection (see current_projection); None until
+# db.vector_projection has been run
+projection = None
+# embedding_projection.fitted_at of `projection`
+_projection_fitted_at = None
+
+
+def connect():
+    """Open the search connection on first call; returns its cursor (None
+    if the database is unreachable)."""
+    global conn, cursor
+
+    if cursor is None:
+        conn = db_connection()
+        if conn:
+            cursor = conn.cursor()
+            ensure_schema(conn, cursor)
+            # Searches only read: never leave a transaction (and its locks)
+            # open between them
+            conn.autocommit = True
+    return cursor
+
+
+def current_projection(cursor, lock=False):
+    """
+    The coarse projection as stored now, reloaded whenever another process
+    has refitted it (its fitted_at changed), so coarse vectors are never
+    written or queried in a stale space or with the old dimension. `lock`
+    keeps a refit out until the caller's transaction ends (writers).
+    """
+    global projection, _projection_fitted_at
+
+    connect()  # the first connection applies the schema (embedding_projection)
+    fitted_at = projection_fitted_at(cursor, lock)
+    if fitted_at != _projection_fitted_at:
+        projection = load_projection(cursor) if fitted_at is not None else None
+        _projection_fitted_at = fitted_at
+    return projection
+
+
+def get_model():
+    """The in-process embedding model, loaded on first call."""
+    global model
+
+    if model is None:
+        model = get_embedder(MODEL_NAME)
+    return model
 
 
 # call the ColorScheme with re here
 DEFAULT_TOP_K = 100
 DEFAULT_THRESHOLD = 0.4
 BM25_WEIGHT = 0.5
+# Coarse stage candidate pool, as a multiple of the rows the full-dimension
+# query keeps (top_k * 2). Larger pools trade latency for recall; 0 always
+# scans the full vectors.
+COARSE_POOL_FACTOR = 10
+# pgvector caps HNSW results at hnsw.ef_search (max 1000), so the pool is
+# clamped to it: with top_k=100 the default factor gives 1000 (5x), and
+# searches whose pool would not exceed their limit scan the full vectors.
+MAX_EF_SEARCH = 1000
+# Results at least this similar (MinHash estimate of shingle Jaccard) to a
+# higher-ranked result are collapsed into it; None disables the step.
+RESULT_DEDUP_THRESHOLD = minhash.DEDUP_THRESHOLD
+# With a latency budget the semantic pool starts at this fraction of top_k
+# rows and doubles (up to top_k * 2) only while the top_k is not final.
+ADAPTIVE_INITIAL_POOL = 0.5
 
 
 def measure_time():
@@ -35,7 +114,18 @@ def measure_time():
     return lambda: time.time() - start
 
 
-def insert_document(content, conn, cursor, model, commit=True, silent=False):
+def insert_document(
+    content,
+    conn,
+    cursor,
+    model,
+    commit=True,
+    silent=False,
+    embedding=None,
+    book_id=None,
+    page_number=None,
+    signature=None,
+):
     if check_if_empty_input(content):
         if not silent:
             print(f"{cs.RED}❌ Input cannot be empty.{cs.RESET}")
@@ -45,23 +135,52 @@ def insert_document(content, conn, cursor, model, commit=True, silent=False):
     nor_content = normalize_content(content)
     language = detect_language(nor_content)
 
+    # With commit=False the caller owns the transaction: a failure only
+    # undoes this row (savepoint), not the rows queued before it
+    savepoint = False
     try:
-        emb = model.encode(nor_content).tolist()
+        if not commit:
+            cursor.execute("SAVEPOINT insert_document")
+            savepoint = True
+        # Precomputed embeddings come from insert_documents (batched encode)
+        emb = embedding if embedding is not None else model.encode(nor_content).tolist()
+        # parse_pdf reports "N/A" for unknown pages
+        page_number = page_number if isinstance(page_number, int) else None
+        # insert_pdf passes the signature it already computed for dedup
+        if signature is None:
+            signature = minhash.signature(nor_content)
         cursor.execute(
-            "INSERT INTO document (content, languages) VALUES (%s, %s) RETURNING id;",
-            (nor_content, language),
+            """
+            INSERT INTO document (content, languages, book_id, page_number, minhash)
+            VALUES (%s, %s, %s, %s, %s) RETURNING id;
+            """,
+            (
+                nor_content,
+                language,
+                book_id,
+                page_number,
+                minhash.to_bytes(signature),
+            ),
         )
         result = cursor.fetchone()
         if result is None:
-            if not silent:
-                print(f"{cs.RED}❌ INSERT failed - no ID returned{cs.RESET}")
-            return False
+            raise RuntimeError("INSERT failed - no ID returned")
 
         doc_id = result[0]
-        cursor.execute(
-            "INSERT INTO document_embedding (doc_id, embedding) VALUES (%s, %s)",
-            (doc_id, emb),
-        )
+        projection = current_projection(cursor, lock=True)
+        if projection is None:
+            cursor.execute(
+                "INSERT INTO document_embedding (doc_id, embedding) VALUES (%s, %s)",
+                (doc_id, emb),
+            )
+        else:
+            cursor.execute(
+                """
+                INSERT INTO document_embedding (doc_id, embedding, coarse_embedding)
+                VALUES (%s, %s, %s)
+                """,
+                (doc_id, emb, projection.project_one(emb)),
+            )
 
         # CONDITIONAL COMMIT
         if commit:
@@ -73,6 +192,7 @@ def insert_document(content, conn, cursor, model, commit=True, silent=False):
                     f"{cs.GREEN}✅ Inserted document (language: {language}). Time: {elapsed_time:.2f}s{cs.RESET}"
                 )
         else:
+            cursor.execute("RELEASE SAVEPOINT insert_document")
             if not silent:
                 # SILENT MODE: Don't print anything for batch operationss
                 elapsed_time = time.time() - start_time
@@ -84,133 +204,646 @@ def insert_document(content, conn, cursor, model, commit=True, silent=False):
         elapsed_time = time.time() - start_time
         print(f"{cs.RED}❌ Error after {elapsed_time:.2f}s: {e}{cs.RESET}")
         print(f"{cs.YELLOW}   Content: '{nor_content[:80]}...'{cs.RESET}")
-        conn.rollback()
+        if savepoint:
+            cursor.execute("ROLLBACK TO SAVEPOINT insert_document")
+        elif commit:
+            conn.rollback()
         return False
 
 
-# Search function
+def insert_documents(
+    contents, conn, cursor, embedder, commit=True, batch_size=256, silent=False
+):
+    """
+    Bulk insert: embeds `contents` in batches with `embedder` (the model or
+    an EmbeddingService worker pool) instead of one encode call per text.
+    Items are strings or chunk dicts (`content`, `book_id`, `page_number`,
+    optionally a precomputed MinHash `signature`).
+    Returns (successful, failed) counts.
+    """
+    successful = failed = 0
 
+    for start in range(0, len(contents), batch_size):
+        batch = [
+            item if isinstance(item, dict) else {"content": item}
+            for item in contents[start : start + batch_size]
+        ]
+        valid = []
+        for item in batch:
+            content = normalize_content(item["content"])
+            if not check_if_empty_input(content):
+                valid.append({**item, "content": content})
+        failed += len(batch) - len(valid)
+        if not valid:
+            continue
+
+        try:
+            embeddings = embedder.encode([item["content"] for item in valid])
+        except Exception as e:
+            # Nothing of this batch reached the database; earlier batches
+            # stay queued (commit=False) or are committed below
+            print(f"{cs.RED}❌ Error embedding {len(valid)} chunks: {e}{cs.RESET}")
+            failed += len(valid)
+            continue
+        for item, emb in zip(valid, embeddings):
+            emb = emb.tolist() if hasattr(emb, "tolist") else emb
+            if insert_document(
+                item["content"],
+                conn,
+                cursor,
+                embedder,
+                commit=False,
+                silent=True,
+                embedding=emb,
+                book_id=item.get("book_id"),
+                page_number=item.get("page_number"),
+                signature=item.get("signature"),
+            ):
+                successful += 1
+            else:
+                failed += 1
 
-def search(
-    query, top_k=DEFAULT_TOP_K, threshold=DEFAULT_THRESHOLD, bm25_weight=BM25_WEIGHT
-):
+        if not silent:
+            print(
+                f"  {cs.CYAN}🔄 Processed {successful + failed}/{len(contents)} chunks...{cs.RESET}"
+            )
+
+    if commit:
+        conn.commit()
+        bm25_utils.update_bm25_index(cursor, normalize_content)
+    return successful, failed
+
+
+def delete_documents(doc_ids, conn, cursor, commit=True, silent=False):
     """
-    Performs a hybrid search combining Semantic (Vector) and BM25 (Keyword) search.
+    Delete documents (and their embeddings) by id.
+    The BM25 index tombstones them right away; no corpus reload needed.
+    Returns the list of deleted ids (empty on failure; with commit=False the
+    caller rolls its transaction back).
     """
-    if check_if_empty_input(query):
-        print(f"{cs.RED}Input cannot be empty.{cs.RESET}")
+    doc_ids = list(doc_ids)
+    if not doc_ids:
         return []
 
-    get_eplased = measure_time()
-    nor_query = normalize_content(query)
-
     try:
-        # --- 1. Semantic Search (PostgreSQL) ---
-        query_vec = model.encode(nor_query).tolist()
-        vec_str = f"[{','.join(map(str, query_vec))}]"
-
         cursor.execute(
-            """
-            SELECT d.id, d.content, (1 - (e.embedding <=> %s::vector)) AS similarity, 
-                   d.languages, d.created_at
-            FROM document d
-            JOIN document_embedding e ON d.id = e.doc_id
-            WHERE (1 - (e.embedding <=> %s::vector)) >= %s
-            ORDER BY e.embedding <=> %s::vector
-            LIMIT %s
-        """,
-            (vec_str, vec_str, threshold, vec_str, top_k * 2),
+            "DELETE FROM document_embedding WHERE doc_id = ANY(%s)", (doc_ids,)
         )
-        rows = cursor.fetchall()
-        semantic_results = [
-            (row[0], row[1], float(row[2]), row[3], row[4]) for row in rows
-        ]
+        cursor.execute(
+            "DELETE FROM document WHERE id = ANY(%s) RETURNING id", (doc_ids,)
+        )
+        deleted = [row[0] for row in cursor.fetchall()]
+        if commit:
+            conn.commit()
+            bm25_utils.remove_from_bm25_index(deleted)
+    except Exception as e:
+        print(f"{cs.RED}❌ Error deleting documents: {e}{cs.RESET}")
+        if commit:
+            conn.rollback()
+        return []
 
-        # --- 2. Hybrid Search (or fallback) ---
-        bm25_utils.update_bm25_index(cursor, normalize_content)
+    if not silent:
+        print(f"{cs.GREEN}🗑️  Deleted {len(deleted)} document(s).{cs.RESET}")
+    return deleted
 
-        if bm25_utils.bm25_index is None or not bm25_utils.bm25_corpus:
-            results = semantic_results
-            bm25_results = []
-        else:
-            # Get BM25 scores
-            bm25_scores = bm25_utils.bm25_index.get_scores(nor_query.split())
-            bm25_results = [
-                (doc_id, content, bm25_scores[i])
-                for i, (doc_id, content) in enumerate(bm25_utils.bm25_corpus)
-            ]
-            bm25_results = [r for r in bm25_results if r[2] > 0]
-
-            # Combine scores
-            combined_results = {}
-            max_semantic = (
-                max([r[2] for r in semantic_results] + [0.01])
-                if semantic_results
-                else 0.01
+
+def source_document_ids(book_id, cursor):
+    """Ids of every chunk ingested from `book_id` (PDF file name)."""
+    cursor.execute("SELECT id FROM document WHERE book_id = %s", (book_id,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def load_minhash_index(cursor, exclude_ids=()):
+    """
+    LSH index over the stored MinHash signatures, keyed by document id,
+    for near-duplicate checks at ingest. `exclude_ids` are left out (e.g.
+    chunks about to be replaced). Rows not backfilled yet (see
+    schema.backfill_minhash) are signed from their content.
+    """
+    exclude_ids = set(exclude_ids)
+    index = minhash.LSHIndex()
+    cursor.execute(
+        "SELECT id, minhash, CASE WHEN minhash IS NULL THEN content END FROM document"
+    )
+    for doc_id, data, content in cursor.fetchall():
+        if doc_id in exclude_ids:
+            continue
+        if data is not None:
+            index.add(doc_id, minhash.from_bytes(data))
+        elif content:
+            index.add(doc_id, minhash.signature(content))
+    return index
+
+
+def delete_source(book_id, conn, cursor, commit=True, silent=False):
+    """Delete every chunk ingested from `book_id` (PDF file name)."""
+    return delete_documents(
+        source_document_ids(book_id, cursor), conn, cursor, commit, silent
+    )
+
+
+def update_document(doc_id, content, conn, cursor, model, silent=False):
+    """
+    Replace a document's content, language and embedding in place.
+    The old BM25 entry is tombstoned and the new text appended.
+    """
+    if check_if_empty_input(content):
+        if not silent:
+            print(f"{cs.RED}❌ Input cannot be empty.{cs.RESET}")
+        return False
+
+    nor_content = normalize_content(content)
+    language = detect_language(nor_content)
+
+    try:
+        emb = model.encode(nor_content).tolist()
+        cursor.execute(
+            """
+            UPDATE document
+            SET content = %s, languages = %s, minhash = %s,
+                updated_at = clock_timestamp()
+            WHERE id = %s
+            """,
+            (
+                nor_content,
+                language,
+                minhash.to_bytes(minhash.signature(nor_content)),
+                doc_id,
+            ),
+        )
+        if cursor.rowcount == 0:
+            if not silent:
+                print(f"{cs.RED}❌ Document {doc_id} not found{cs.RESET}")
+            conn.rollback()
+            return False
+        projection = current_projection(cursor, lock=True)
+        if projection is None:
+            cursor.execute(
+                "UPDATE document_embedding SET embedding = %s WHERE doc_id = %s",
+                (emb, doc_id),
             )
-            max_bm25 = (
-                max([r[2] for r in bm25_results] + [0.01]) if bm25_results else 0.01
+        else:
+            cursor.execute(
+                """
+                UPDATE document_embedding SET embedding = %s, coarse_embedding = %s
+                WHERE doc_id = %s
+                """,
+                (emb, projection.project_one(emb), doc_id),
             )
+        conn.commit()
+        bm25_utils.reindex_documents(cursor, [doc_id], normalize_content)
+    except Exception as e:
+        print(f"{cs.RED}❌ Error updating document {doc_id}: {e}{cs.RESET}")
+        conn.rollback()
+        return False
 
-            # Add semantic results
-            for doc_id, content, score, lang, created in semantic_results or []:
-                combined_results[doc_id] = (
-                    content,
-                    score / max_semantic * bm25_weight,
-                    lang,
-                    created,
-                )
+    if not silent:
+        print(
+            f"{cs.GREEN}✅ Updated document {doc_id} (language: {language}){cs.RESET}"
+        )
+    return True
 
-            # Add BM25 results
-            bm25_term_weight = 1 - bm25_weight
-            for doc_id, content, score in bm25_results or []:
-                normalized_bm25_score = (
-                    score / max_bm25 * bm25_term_weight if max_bm25 > 0 else 0
-                )
 
-                if doc_id in combined_results:
-                    current_content, current_score, current_lang, current_created = (
-                        combined_results[doc_id]
-                    )
-                    combined_results[doc_id] = (
-                        current_content,
-                        current_score + normalized_bm25_score,
-                        current_lang,
-                        current_created,
-                    )
-                else:
-                    combined_results[doc_id] = (
-                        content,
-                        normalized_bm25_score,
-                        None,
-                        None,
-                    )
-
-            results = [
-                (doc_id, content, score, lang, created)
-                for doc_id, (content, score, lang, created) in combined_results.items()
-            ]
-            results.sort(key=lambda x: x[2], reverse=True)
+def fit_coarse_vectors(conn, cursor, dims=COARSE_DIMS, method="pca"):
+    """
+    Fit the coarse projection on the stored embeddings and backfill every
+    row (see db.vector_projection). Every process, this one included, picks
+    the new projection up on its next insert, update or search (see
+    current_projection).
+    """
+    return fit_coarse_projection(conn, cursor, dims, method)
 
-    except Exception as e:
-        print(f"{cs.RED}Error during search: {e}{cs.RESET}")
-        return []
 
+# Search function
+
+
+def _filter_sql(filters):
+    """Translate normalized search filters into WHERE clauses on `document d`."""
+    clauses = []
+    params = []
+    if "language" in filters:
+        clauses.append("d.languages = ANY(%s)")
+        params.append(filters["language"])
+    if "source" in filters:
+        clauses.append("d.book_id = ANY(%s)")
+        params.append(filters["source"])
+    if "page_from" in filters:
+        clauses.append("d.page_number >= %s")
+        params.append(filters["page_from"])
+    if "page_to" in filters:
+        clauses.append("d.page_number <= %s")
+        params.append(filters["page_to"])
+    if "created_after" in filters:
+        clauses.append("d.created_at >= %s")
+        params.append(filters["created_after"])
+    if "created_before" in filters:
+        clauses.append("d.created_at <= %s")
+        params.append(filters["created_before"])
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def _search_response(query, results=(), error=None, **stats):
+    response = {"query": query, "results": list(results), **stats}
+    if error:
+        response["error"] = error
+    return response
+
+
+def render_response(response, output="rich", max_rows=None):
+    """
+    Render a search() response.
+    - "rich": results table (only the first `max_rows` rows are formatted)
+    - "jsonl": one JSON object per line on stdout
+    """
+    if output == "jsonl":
+        write_jsonl(response)
+        return
+
+    if response.get("error"):
+        print(f"{cs.RED}{response['error']}{cs.RESET}")
+        return
+    results = response["results"]
     if not results:
         print(f"{cs.RED}No relevant results found.{cs.RESET}")
-        return []
-    # Display results
-    display_results(results[:top_k], query=query)
+        return
 
-    # Clean output
-    print(f"{cs.GREEN}Semantic results: {len(semantic_results)} documents{cs.RESET}")
-    if bm25_results:
+    display_results(results, query=response["query"], max_rows=max_rows)
+    print(
+        f"{cs.GREEN}Semantic results: {response['semantic_count']} documents{cs.RESET}"
+    )
+    if response["bm25_count"]:
         print(
-            f"{cs.GREEN}BM25 results: {len(bm25_results)} documents with score > 0{cs.RESET}"
+            f"{cs.GREEN}BM25 results: {response['bm25_count']} documents with score > 0{cs.RESET}"
+        )
+    if response.get("duplicates"):
+        print(
+            f"{cs.YELLOW}Near-duplicate results collapsed: {response['duplicates']}{cs.RESET}"
         )
-
     print(
-        f"\n{cs.OKBLUE}Search complete. {len(results[:top_k])} results shown. Time: {get_eplased():.2f}s{cs.RESET}"
+        f"\n{cs.OKBLUE}Search complete. {len(results)} results shown. Time: {response['elapsed']:.2f}s{cs.RESET}"
+    )
+
+
+def search(
+    query,
+    top_k=DEFAULT_TOP_K,
+    threshold=DEFAULT_THRESHOLD,
+    bm25_weight=BM25_WEIGHT,
+    filters=None,
+    output=None,
+    coarse_factor=None,
+    dedup=True,
+    budget=None,
+):
+    """
+    Performs a hybrid search combining Semantic (Vector) and BM25 (Keyword) search.
+    - `filters`: optional dict restricting both legs before ranking, e.g.
+      {"language": "fa", "source": "book.pdf", "page_from": 10, "page_to": 20,
+       "created_after": "2025-01-01", "created_before": date.today()}
+    - `output`: None (default) returns silently; "rich" prints a table,
+      "jsonl" prints the response as one JSON line (see render_response)
+    - `coarse_factor`: coarse-vector candidate pool multiple (default
+      COARSE_POOL_FACTOR; 0 disables the coarse stage)
+    - `dedup`: collapse near-duplicate results (see RESULT_DEDUP_THRESHOLD)
+      into the highest-ranked copy, filling top_k from lower-ranked hits
+    - `budget`: target latency in seconds. Both legs start small and grow
+      only until the fused top_k is provably final or the deadline is near
+      (see _budgeted_legs); `exact` in the response says which happened
+
+    Returns a response dict: `query`, `results` (dicts with id, content,
+    score, language, created_at, book_id, page_number), `semantic_count`,
+    `bm25_count` (with a budget: documents scored, a lower bound),
+    `duplicates` (results collapsed by dedup), `exact` (False if the budget
+    cut retrieval short), `elapsed` and, on failure, `error`.
+    """
+    get_eplased = measure_time()
+    deadline = time.time() + budget if budget is not None else None
+
+    if check_if_empty_input(query):
+        response = _search_response(query, error="Input cannot be empty.")
+    elif connect() is None:
+        response = _search_response(query, error="No database connection.")
+    else:
+        try:
+            response = _hybrid_search(
+                query,
+                top_k,
+                threshold,
+                bm25_weight,
+                filters,
+                coarse_factor,
+                dedup,
+                deadline,
+                silent=output != "rich",
+            )
+        except Exception as e:
+            response = _search_response(query, error=f"Error during search: {e}")
+
+    response["elapsed"] = get_eplased()
+    if output:
+        render_response(response, output)
+    return response
+
+
+def _semantic_search(query_vec, limit, threshold, filters, coarse_factor=None):
+    """
+    Up to `limit` documents with similarity >= `threshold`. Returns
+    ({id: result}, {id: stored MinHash signature}).
+
+    With a fitted projection the coarse vectors first pick
+    `limit * coarse_factor` candidates (at most MAX_EF_SEARCH) through their
+    HNSW index, and only that pool, plus any rows still missing a coarse
+    vector, is scored on the full embedding. Filtered searches skip the
+    coarse stage: the HNSW scan filters after the fact, so a selective
+    filter would leave only a few of the pool.
+    """
+    filter_sql, filter_params = _filter_sql(filters)
+    vec_str = vector_literal(query_vec)
+    if coarse_factor is None:
+        coarse_factor = COARSE_POOL_FACTOR
+    pool = min(int(limit * coarse_factor), MAX_EF_SEARCH)
+
+    projection = current_projection(cursor)
+    if projection is None or filters or pool <= limit:
+        cursor.execute(
+            f"""
+            SELECT d.id, d.content, (1 - (e.embedding <=> %s::vector)) AS similarity,
+                   d.languages, d.created_at, d.book_id, d.page_number, d.minhash
+            FROM document d
+            JOIN document_embedding e ON d.id = e.doc_id
+            WHERE (1 - (e.embedding <=> %s::vector)) >= %s{filter_sql}
+            ORDER BY e.embedding <=> %s::vector
+            LIMIT %s
+        """,
+            (vec_str, vec_str, threshold, *filter_params, vec_str, limit),
+        )
+    else:
+        coarse_str = vector_literal(projection.project_one(query_vec))
+        cursor.execute("SET hnsw.ef_search = %s", (max(pool, 40),))
+        # Rows inserted by a process that predates the projection have no
+        # coarse vector (until backfill_coarse_vectors); they are always
+        # candidates
+        cursor.execute(
+            """
+            WITH candidates AS (
+                (
+                    SELECT e.doc_id, e.embedding
+                    FROM document_embedding e
+                    WHERE e.coarse_embedding IS NOT NULL
+                    ORDER BY e.coarse_embedding <=> %s::vector
+                    LIMIT %s
+                )
+                UNION ALL
+                SELECT e.doc_id, e.embedding
+                FROM document_embedding e
+                WHERE e.coarse_embedding IS NULL
+            )
+            SELECT d.id, d.content, (1 - (c.embedding <=> %s::vector)) AS similarity,
+                   d.languages, d.created_at, d.book_id, d.page_number, d.minhash
+            FROM candidates c
+            JOIN document d ON d.id = c.doc_id
+            WHERE (1 - (c.embedding <=> %s::vector)) >= %s
+            ORDER BY c.embedding <=> %s::vector
+            LIMIT %s
+        """,
+            (coarse_str, pool, vec_str, vec_str, threshold, vec_str, limit),
+        )
+
+    results = {}
+    signatures = {}
+    for row in cursor.fetchall():
+        results[row[0]] = {
+            "id": row[0],
+            "content": row[1],
+            "score": float(row[2]),
+            "language": row[3],
+            "created_at": row[4],
+            "book_id": row[5],
+            "page_number": row[6],
+        }
+        if row[7] is not None:
+            signatures[row[0]] = minhash.from_bytes(row[7])
+    return results, signatures
+
+
+def _fuse(semantic_results, bm25_scores, bm25_weight, use_bm25):
+    """Fused score per document (see _hybrid_search)."""
+    if not use_bm25:
+        # Semantic-only fallback keeps the raw similarity scores
+        return {doc_id: r["score"] for doc_id, r in semantic_results.items()}
+
+    max_semantic = max([r["score"] for r in semantic_results.values()] + [0.01])
+    max_bm25 = max(list(bm25_scores.values()) + [0.01])
+    bm25_term_weight = 1 - bm25_weight
+
+    combined = {
+        doc_id: r["score"] / max_semantic * bm25_weight
+        for doc_id, r in semantic_results.items()
+    }
+    for doc_id, score in bm25_scores.items():
+        combined[doc_id] = combined.get(doc_id, 0) + score / max_bm25 * bm25_term_weight
+    return combined
+
+
+def _fused_top_is_final(
+    combined, semantic_results, bm25_scores, bm25_weight, top_k, bm25_k
+):
+    """
+    True if the fused top_k from a semantic pool smaller than the full
+    depth is the one the full depth would give (score-bound check).
+
+    The pool holds every document more similar than its last row, so a
+    document outside it can gain at most that similarity from the semantic
+    leg, and at most the bm25_k-th BM25 score if BM25 did not return it.
+    """
+    max_semantic = max([r["score"] for r in semantic_results.values()] + [0.01])
+    max_bm25 = max(list(bm25_scores.values()) + [0.01])
+    semantic_gap = (
+        min(r["score"] for r in semantic_results.values()) / max_semantic * bm25_weight
+        if semantic_results
+        else 0
+    )
+    bm25_top = heapq.nlargest(bm25_k, bm25_scores.values())
+    bm25_gap = (
+        bm25_top[-1] / max_bm25 * (1 - bm25_weight) if len(bm25_top) == bm25_k else 0
     )
 
-    return results[:top_k]
+    ranked = heapq.nlargest(len(combined), combined.items(), key=lambda item: item[1])
+    top, rest = ranked[:top_k], ranked[top_k:]
+    if semantic_gap > 0 and any(doc_id not in semantic_results for doc_id, _ in top):
+        return False  # its semantic score is still unknown
+    if len(top) < top_k:
+        return semantic_gap + bm25_gap <= 0
+
+    # Upper bounds of everything that could still overtake the k-th result
+    bounds = [semantic_gap + bm25_gap] + [
+        score + (0 if doc_id in semantic_results else semantic_gap)
+        for doc_id, score in rest
+    ]
+    return top[-1][1] >= max(bounds)
+
+
+def _budgeted_legs(
+    query_vec,
+    tokens,
+    top_k,
+    threshold,
+    bm25_weight,
+    filters,
+    coarse_factor,
+    bm25_index,
+    bm25_k,
+    deadline,
+):
+    """
+    Both legs under a deadline. The semantic pool starts at
+    ADAPTIVE_INITIAL_POOL * top_k rows and doubles up to the full top_k * 2
+    only while the fused top_k is not provably final and the next round is
+    expected to fit before the deadline. BM25 uses pruned scoring.
+
+    Returns (semantic_results, signatures, bm25_scores, bm25_count, exact,
+    full_depth); `exact` covers the fused top_k, and ranks beyond it only
+    when `full_depth` (the pool was not cut short).
+    """
+    use_bm25 = bm25_index is not None and bm25_index.live_count
+    depth = top_k * 2
+    pool = min(depth, max(1, math.ceil(top_k * ADAPTIVE_INITIAL_POOL)))
+    bm25_scores, bm25_count, bm25_complete = {}, 0, True
+    scored = set()
+
+    while True:
+        round_start = time.time()
+        semantic_results, signatures = _semantic_search(
+            query_vec, pool, threshold, filters, coarse_factor
+        )
+        if use_bm25:
+            if not scored:
+                bm25_scores, bm25_count, bm25_complete = bm25_index.pruned_top_scores(
+                    tokens, bm25_k, filters, semantic_results, deadline=deadline
+                )
+            else:
+                # Only the new semantic hits need their BM25 scores
+                new_ids = [
+                    doc_id for doc_id in semantic_results if doc_id not in scored
+                ]
+                extra, _, _ = bm25_index.pruned_top_scores(tokens, 0, filters, new_ids)
+                bm25_scores.update(extra)
+            scored.update(semantic_results)
+
+        legs = (semantic_results, signatures, bm25_scores, bm25_count)
+        if pool >= depth or len(semantic_results) < pool:
+            return (*legs, bm25_complete, True)
+        if not use_bm25:
+            if pool >= top_k:  # raw similarity: the first top_k rows are final
+                return (*legs, True, False)
+        elif _fused_top_is_final(
+            _fuse(semantic_results, bm25_scores, bm25_weight, True),
+            semantic_results,
+            bm25_scores,
+            bm25_weight,
+            top_k,
+            bm25_k,
+        ):
+            return (*legs, bm25_complete, False)
+
+        # The next round scans about twice as many rows
+        now = time.time()
+        if now + 2 * (now - round_start) > deadline:
+            return (*legs, False, False)
+        pool = min(depth, pool * 2)
+
+
+def _hybrid_search(
+    query,
+    top_k,
+    threshold,
+    bm25_weight,
+    filters,
+    coarse_factor,
+    dedup,
+    deadline,
+    silent,
+):
+    nor_query = normalize_content(query)
+    filters = normalize_filters(filters)
+    query_vec = get_model().encode(nor_query).tolist()
+
+    bm25_utils.update_bm25_index(cursor, normalize_content, silent=silent)
+    bm25_index = bm25_utils.bm25_index
+    use_bm25 = bm25_index is not None and bm25_index.live_count > 0
+    tokens = tokenize(nor_query)
+    # Only the BM25 top_k and the semantic hits can reach the fused top_k,
+    # so nothing else is returned (or sent back by shards). Dedup takes a
+    # deeper list, like the semantic leg, to refill collapsed slots.
+    bm25_k = top_k * 2 if dedup else top_k
+
+    if deadline is None:
+        # --- 1. Semantic Search (PostgreSQL) ---
+        semantic_results, signatures = _semantic_search(
+            query_vec, top_k * 2, threshold, filters, coarse_factor
+        )
+        # --- 2. BM25; filters and tombstones apply before scoring ---
+        bm25_scores, bm25_count = (
+            bm25_index.top_scores(tokens, bm25_k, filters, include_ids=semantic_results)
+            if use_bm25
+            else ({}, 0)
+        )
+        exact = full_depth = True
+    else:
+        semantic_results, signatures, bm25_scores, bm25_count, exact, full_depth = (
+            _budgeted_legs(
+                query_vec,
+                tokens,
+                top_k,
+                threshold,
+                bm25_weight,
+                filters,
+                coarse_factor,
+                bm25_index,
+                bm25_k,
+                deadline,
+            )
+        )
+    combined = _fuse(semantic_results, bm25_scores, bm25_weight, use_bm25)
+
+    # Rows are materialized top_k at a time; without dedup (or without
+    # duplicates) only the first top_k are.
+    ranked = heapq.nlargest(len(combined), combined.items(), key=lambda item: item[1])
+    kept = minhash.LSHIndex() if dedup and RESULT_DEDUP_THRESHOLD else None
+    results = []
+    duplicates = 0
+
+    for start in range(0, len(ranked), top_k):
+        window = ranked[start : start + top_k]
+        keyword_only = [
+            doc_id for doc_id, _ in window if doc_id not in semantic_results
+        ]
+        documents = bm25_index.documents(keyword_only) if keyword_only else {}
+
+        for doc_id, score in window:
+            result = semantic_results.get(doc_id)
+            if result is None:
+                result = {"id": doc_id, **documents[doc_id]}
+            if kept is not None:
+                signature = signatures.get(doc_id)
+                if signature is None:
+                    signature = minhash.signature(result["content"])
+                if kept.find_duplicate(signature, RESULT_DEDUP_THRESHOLD) is not None:
+                    duplicates += 1
+                    continue
+                kept.add(doc_id, signature)
+            results.append({**result, "score": score})
+            if len(results) == top_k:
+                break
+        if len(results) == top_k or kept is None:
+            break
+
+    return _search_response(
+        query,
+        results,
+        semantic_count=len(semantic_results),
+        bm25_count=bm25_count,
+        duplicates=duplicates,
+        # Slots refilled after dedup come from ranks beyond the certified top_k
+        exact=exact and (full_depth or not duplicates),
+    )
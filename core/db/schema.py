@@ -0,0 +1,184 @@
+import sys
+
+from psycopg2.extras import execute_values
+
+from utils import minhash
+
+# Columns, indexes and tables added on top of the base document and
+# document_embedding tables, as (relation, column, statement): the statement
+# runs only if that column (or, with column None, that index or table) is
+# missing, so a start-up check takes no lock on an up-to-date database.
+SCHEMA_UPDATES = [
+    ("document", "book_id", "ALTER TABLE document ADD COLUMN book_id TEXT"),
+    ("document", "page_number", "ALTER TABLE document ADD COLUMN page_number INTEGER"),
+    # MinHash signature (utils/minhash.py) for near-duplicate detection
+    ("document", "minhash", "ALTER TABLE document ADD COLUMN minhash BYTEA"),
+    # Change watermark for in-process BM25 indexes (utils/bm25_utils.py)
+    (
+        "document",
+        "updated_at",
+        "ALTER TABLE document ADD COLUMN updated_at TIMESTAMP DEFAULT now()",
+    ),
+    (
+        "idx_document_languages",
+        None,
+        "CREATE INDEX IF NOT EXISTS idx_document_languages ON document (languages)",
+    ),
+    (
+        "idx_document_book_page",
+        None,
+        "CREATE INDEX IF NOT EXISTS idx_document_book_page ON document (book_id, page_number)",
+    ),
+    (
+        "idx_document_created_at",
+        None,
+        "CREATE INDEX IF NOT EXISTS idx_document_created_at ON document (created_at)",
+    ),
+    (
+        "idx_document_updated_at",
+        None,
+        "CREATE INDEX IF NOT EXISTS idx_document_updated_at ON document (updated_at)",
+    ),
+    # Rows still waiting for backfill_minhash
+    (
+        "idx_document_minhash_missing",
+        None,
+        """
+        CREATE INDEX IF NOT EXISTS idx_document_minhash_missing ON document (id)
+        WHERE minhash IS NULL
+        """,
+    ),
+    # Fitted coarse-vector projection (see db/vector_projection.py)
+    (
+        "embedding_projection",
+        None,
+        """
+        CREATE TABLE IF NOT EXISTS embedding_projection (
+            method TEXT NOT NULL,
+            dims INTEGER NOT NULL,
+            mean BYTEA NOT NULL,
+            components BYTEA NOT NULL,
+            fitted_at TIMESTAMP DEFAULT now()
+        )
+        """,
+    ),
+]
+
+# ALTER TABLE needs an ACCESS EXCLUSIVE lock: rather than queue behind (and
+# in front of) other sessions' transactions, give up after this long and
+# leave the update to `python -m db.schema`.
+SCHEMA_LOCK_TIMEOUT = "5s"
+
+
+def pending_schema_updates(cursor):
+    """Statements from SCHEMA_UPDATES whose column or relation is missing."""
+    pending = []
+    for relation, column, statement in SCHEMA_UPDATES:
+        if column is None:
+            cursor.execute("SELECT to_regclass(%s) IS NULL", (relation,))
+        else:
+            cursor.execute(
+                """
+                SELECT NOT EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = current_schema()
+                      AND table_name = %s AND column_name = %s
+                )
+                """,
+                (relation, column),
+            )
+        if cursor.fetchone()[0]:
+            pending.append(statement)
+    return pending
+
+
+def ensure_schema(conn, cursor, lock_timeout=SCHEMA_LOCK_TIMEOUT):
+    """
+    Apply the missing SCHEMA_UPDATES, waiting at most `lock_timeout` for
+    each table lock (None waits indefinitely). Returns False (and rolls
+    back) on failure.
+    """
+    try:
+        pending = pending_schema_updates(cursor)
+        if pending and lock_timeout is not None:
+            cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+        for statement in pending:
+            cursor.execute(statement)
+        # Also ends the catalog reads' transaction when nothing was pending
+        conn.commit()
+        return True
+    except Exception as e:
+        print(
+            f"Error updating database schema (run python -m db.schema). Details: {e}",
+            file=sys.stderr,
+        )
+        conn.rollback()
+        return False
+
+
+def backfill_minhash(conn, cursor, batch_size=1000):
+    """
+    Store MinHash signatures for documents inserted before the `minhash`
+    column existed, committing each batch. Returns the number of rows
+    written (None on failure).
+    """
+    last_id = 0
+    written = 0
+    try:
+        while True:
+            cursor.execute(
+                """
+                SELECT id, content FROM document
+                WHERE minhash IS NULL AND id > %s ORDER BY id LIMIT %s
+                """,
+                (last_id, batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            execute_values(
+                cursor,
+                """
+                UPDATE document d SET minhash = v.minhash
+                FROM (VALUES %s) AS v (id, minhash)
+                WHERE d.id = v.id
+                """,
+                [
+                    (doc_id, minhash.to_bytes(minhash.signature(content or "")))
+                    for doc_id, content in rows
+                ],
+            )
+            conn.commit()
+            written += len(rows)
+            last_id = rows[-1][0]
+    except Exception as e:
+        print(f"Error backfilling MinHash signatures. Details: {e}", file=sys.stderr)
+        conn.rollback()
+        return None
+
+    if written:
+        print(f"Backfilled MinHash signatures for {written} documents", file=sys.stderr)
+    return written
+
+
+if __name__ == "__main__":
+    # Maintenance step, run on its own (not by search or ingest processes):
+    # migrate, waiting for locks instead of timing out, then fill in the
+    # MinHash signatures and coarse vectors of rows stored without them
+    from db.db_connection import db_connection
+    from db.vector_projection import backfill_coarse_vectors, load_projection
+
+    conn = db_connection()
+    if conn is None:
+        sys.exit(1)
+    with conn.cursor() as cursor:
+        ok = ensure_schema(conn, cursor, lock_timeout=None)
+        if ok:
+            ok = backfill_minhash(conn, cursor) is not None
+            projection = load_projection(cursor)
+            if ok and projection is not None:
+                ok = backfill_coarse_vectors(conn, cursor, projection) is not None
+    conn.close()
+    if not ok:
+        sys.exit(1)
+    print("Database schema and backfills are up to date", file=sys.stderr)
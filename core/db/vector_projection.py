@@ -0,0 +1,199 @@
+"""
+Coarse (low-dimensional) copies of the document embeddings.
+
+The projection is fitted on a sample of `document_embedding`, stored in
+`embedding_projection` and applied to every embedding into the
+`coarse_embedding` column, which gets an HNSW index. search() then picks a
+candidate pool on the coarse vectors and rescores it at full dimension.
+Writers and searches check `fitted_at` first (projection_fitted_at) and
+reload the projection when another process has refitted it. Rows written
+without a coarse vector (before the fit) are filled in by
+backfill_coarse_vectors (`python -m db.schema`).
+
+    python -m db.vector_projection [dims] [pca|truncate]
+"""
+
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from psycopg2.extras import execute_values
+
+from models.projection import Projection, parse_vector
+from utils.ColorScheme import ColorScheme
+
+cs = ColorScheme()
+
+COARSE_DIMS = 64
+FIT_SAMPLE_SIZE = 20000
+BACKFILL_BATCH_SIZE = 1000
+
+# search() always rescores rows without a coarse vector; this keeps finding
+# them cheap
+_CREATE_MISSING_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_document_embedding_coarse_missing
+    ON document_embedding (doc_id) WHERE coarse_embedding IS NULL
+"""
+
+
+def vector_literal(values):
+    """pgvector input text for a sequence of floats."""
+    return f"[{','.join(map(str, values))}]"
+
+
+def projection_fitted_at(cursor, lock=False):
+    """
+    When the stored projection was fitted (None if there is none), a cheap
+    version check before coarse vectors are written or queried. With `lock`
+    the row is held (FOR SHARE) until the caller's transaction ends, so a
+    refit waits instead of replacing the column under its writes.
+    """
+    cursor.execute(
+        "SELECT fitted_at FROM embedding_projection" + (" FOR SHARE" if lock else "")
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def load_projection(cursor):
+    """The fitted projection, or None if none was fitted yet."""
+    cursor.execute("SELECT method, dims, mean, components FROM embedding_projection")
+    row = cursor.fetchone()
+    return Projection.from_bytes(*row) if row else None
+
+
+def _save_projection(cursor, projection):
+    mean, components = projection.to_bytes()
+    cursor.execute("DELETE FROM embedding_projection")
+    cursor.execute(
+        """
+        INSERT INTO embedding_projection (method, dims, mean, components)
+        VALUES (%s, %s, %s, %s)
+        """,
+        (projection.method, projection.dims, mean, components),
+    )
+
+
+def _backfill(cursor, projection, batch_size=BACKFILL_BATCH_SIZE, missing_only=False):
+    """
+    Write coarse vectors for every embedding (or only those without one),
+    one id range at a time.
+    """
+    missing_sql = " AND coarse_embedding IS NULL" if missing_only else ""
+    last_id = 0
+    written = 0
+    while True:
+        cursor.execute(
+            f"""
+            SELECT doc_id, embedding FROM document_embedding
+            WHERE doc_id > %s{missing_sql} ORDER BY doc_id LIMIT %s
+            """,
+            (last_id, batch_size),
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return written
+
+        coarse = projection.project([parse_vector(embedding) for _, embedding in rows])
+        execute_values(
+            cursor,
+            """
+            UPDATE document_embedding e SET coarse_embedding = v.coarse::vector
+            FROM (VALUES %s) AS v (doc_id, coarse)
+            WHERE e.doc_id = v.doc_id
+            """,
+            [
+                (doc_id, vector_literal(vector))
+                for (doc_id, _), vector in zip(rows, coarse)
+            ],
+        )
+        written += len(rows)
+        last_id = rows[-1][0]
+
+
+def fit_coarse_projection(
+    conn, cursor, dims=COARSE_DIMS, method="pca", sample_size=FIT_SAMPLE_SIZE
+):
+    """
+    Fit a `dims`-dimensional projection on up to `sample_size` stored
+    embeddings, rebuild `coarse_embedding` (with its HNSW index) for every
+    row and store the projection. Runs in one transaction; returns the
+    projection, or None on failure.
+    """
+    try:
+        cursor.execute(
+            "SELECT embedding FROM document_embedding ORDER BY random() LIMIT %s",
+            (sample_size,),
+        )
+        sample = [parse_vector(row[0]) for row in cursor.fetchall()]
+        projection = Projection.fit(sample, dims, method)
+
+        # Replacing the stored projection first waits for writers holding
+        # it (projection_fitted_at(lock=True)); new fitted_at tells every
+        # process to reload
+        _save_projection(cursor, projection)
+        # The column type carries the dimension, so a refit replaces it
+        cursor.execute(
+            "ALTER TABLE document_embedding DROP COLUMN IF EXISTS coarse_embedding"
+        )
+        cursor.execute(
+            f"ALTER TABLE document_embedding ADD COLUMN coarse_embedding vector({projection.dims})"
+        )
+        written = _backfill(cursor, projection)
+        cursor.execute("""
+            CREATE INDEX idx_document_embedding_coarse ON document_embedding
+            USING hnsw (coarse_embedding vector_cosine_ops)
+            """)
+        cursor.execute(_CREATE_MISSING_INDEX)
+        conn.commit()
+    except Exception as e:
+        print(f"{cs.RED}❌ Error fitting coarse projection: {e}{cs.RESET}")
+        conn.rollback()
+        return None
+
+    print(
+        f"{cs.GREEN}✅ Coarse {projection.method} projection ({projection.dims} dims) "
+        f"fitted on {len(sample)} embeddings, {written} rows updated{cs.RESET}"
+    )
+    return projection
+
+
+def backfill_coarse_vectors(conn, cursor, projection):
+    """
+    Fill in coarse vectors missing from rows inserted without the
+    projection. Returns the number of rows written (None on failure).
+    """
+    try:
+        cursor.execute(_CREATE_MISSING_INDEX)
+        written = _backfill(cursor, projection, missing_only=True)
+        conn.commit()
+    except Exception as e:
+        print(
+            f"{cs.RED}❌ Error backfilling coarse vectors: {e}{cs.RESET}",
+            file=sys.stderr,
+        )
+        conn.rollback()
+        return None
+
+    if written:
+        print(
+            f"{cs.GREEN}✅ Backfilled {written} missing coarse vectors{cs.RESET}",
+            file=sys.stderr,
+        )
+    return written
+
+
+if __name__ == "__main__":
+    from db.db_connection import db_connection
+
+    conn = db_connection()
+    if conn is None:
+        sys.exit(1)
+    with conn.cursor() as cursor:
+        fit_coarse_projection(
+            conn,
+            cursor,
+            int(sys.argv[1]) if len(sys.argv) > 1 else COARSE_DIMS,
+            sys.argv[2] if len(sys.argv) > 2 else "pca",
+        )
+    conn.close()
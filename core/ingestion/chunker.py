@@ -0,0 +1,151 @@
+import re
+
+# Ingestion defaults (also used by benchmarks.chunker_benchmark)
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+HEADER_PATTERNS = [
+    r"^chapter\s+\d+.*$",  # e.g., "Chapter 2: ..."
+    r"^ai engineering.*$",  # book title repeating
+]
+
+FOOTER_PATTERNS = [
+    r"^\s*\d+\s*$",  # page numbers only
+    r"^\s*page\s+\d+\s*$",  # "Page 23"
+]
+
+# Preferred cut points, best first. "\n" marks an element boundary inside
+# the page buffer, the rest match the old RecursiveCharacterTextSplitter.
+_SEPARATORS = (("\n", 0, 1), (". ", 1, 2), ("! ", 1, 2), ("? ", 1, 2), (" ", 0, 1))
+
+
+def compile_line_patterns(patterns):
+    """
+    Combine header/footer regexes into one precompiled, case-insensitive
+    pattern so each line is tested once instead of once per pattern.
+    """
+    patterns = [p for p in patterns or [] if p]
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
+def clean_element(text: str, line_pattern=None) -> str:
+    """
+    Single pass over an element's text:
+    - drops lines matching `line_pattern` (headers, footers, page numbers)
+    - collapses whitespace and lowercases (same result as normalize_content)
+    """
+    if not text:
+        return ""
+
+    words = []
+    for line in text.splitlines():
+        if line_pattern is not None and line_pattern.match(line.strip()):
+            continue
+        words.extend(line.split())
+    return " ".join(words).lower()
+
+
+def _split_point(text: str, chunk_size: int):
+    """Return (chunk_end, rest_start) for the best cut within chunk_size."""
+    window = text[: chunk_size + 1]
+    for separator, keep, skip in _SEPARATORS:
+        pos = window.rfind(separator)
+        # Avoid cutting off tiny chunks when a separator sits near the start
+        if pos > chunk_size // 2:
+            return pos + keep, pos + skip
+    return chunk_size, chunk_size
+
+
+def _overlap_tail(chunk: str, chunk_overlap: int) -> str:
+    """Last `chunk_overlap` characters of a chunk, starting on a word."""
+    if chunk_overlap <= 0 or len(chunk) <= chunk_overlap:
+        return ""
+    tail = chunk[-chunk_overlap:]
+    space = tail.find(" ")
+    return tail[space + 1 :] if space != -1 else tail
+
+
+def _split_page(buffer: str, chunk_size: int, chunk_overlap: int):
+    """Split one page buffer into overlapping chunks."""
+    while buffer:
+        if len(buffer) <= chunk_size:
+            chunk = buffer.replace("\n", " ").strip()
+            if chunk:
+                yield chunk
+            return
+
+        end, rest = _split_point(buffer, chunk_size)
+        chunk = buffer[:end].replace("\n", " ").strip()
+        if chunk:
+            yield chunk
+
+        tail = _overlap_tail(chunk, chunk_overlap)
+        if len(tail) >= rest:
+            tail = ""  # overlap would stall progress on a hard cut
+        remaining = buffer[rest:].lstrip()
+        if not remaining:
+            return
+        # A hard cut (rest == end) splits a word: rejoin the tail without a space
+        joiner = " " if rest > end else ""
+        buffer = f"{tail}{joiner}{remaining}" if tail else remaining
+
+
+def iter_chunks(
+    elements,
+    chunk_size: int,
+    chunk_overlap: int,
+    header_patterns=None,
+    footer_patterns=None,
+    min_element_length=15,
+    stats=None,
+):
+    """
+    Stream parsed PDF elements (see parse_pdf) into chunks.
+
+    Elements are cleaned once with precompiled patterns and packed into
+    page buffers; chunks never cross a page and prefer element, then
+    sentence, then word boundaries. Yields dicts with `content`,
+    `book_id` and `page_number`.
+
+    When `stats` is given, `skipped_short` and `total_chunks_created`
+    counters are updated in place.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError(
+            f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})"
+        )
+
+    line_pattern = compile_line_patterns(
+        list(header_patterns or []) + list(footer_patterns or [])
+    )
+
+    def flush(parts, book_id, page_number):
+        for chunk in _split_page("\n".join(parts), chunk_size, chunk_overlap):
+            if stats is not None:
+                stats["total_chunks_created"] += 1
+            yield {"content": chunk, "book_id": book_id, "page_number": page_number}
+
+    parts = []
+    current_page = None
+    current_book = None
+
+    for element in elements:
+        content = clean_element(element["raw_text"], line_pattern)
+        if len(content) < min_element_length:
+            if stats is not None:
+                stats["skipped_short"] += 1
+            continue
+
+        page_number = element.get("page_number")
+        book_id = element.get("book_id")
+        if parts and (page_number, book_id) != (current_page, current_book):
+            yield from flush(parts, current_book, current_page)
+            parts = []
+
+        current_page, current_book = page_number, book_id
+        parts.append(content)
+
+    if parts:
+        yield from flush(parts, current_book, current_page)
@@ -1,60 +1,57 @@
 import os
-import re
 
 from pyparsing import C
 
-from db.database_operations import insert_document
+from db.database_operations import (
+    delete_documents,
+    get_model,
+    insert_documents,
+    load_minhash_index,
+    source_document_ids,
+)
 from core.utils.languages import detect_language
 from core.utils.text_properties import (
     normalize_content,
 )
-from core.utils.bm25_utils import update_bm25_index
+import utils.bm25_utils as bm25_utils
+from utils import minhash
 
 # 1. Unstructured_pdf_elements
 from ingestion.unstructured_pdf_elements import parse_pdf
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from ingestion.chunker import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    FOOTER_PATTERNS,
+    HEADER_PATTERNS,
+    iter_chunks,
+)
 
 # Import the ColorScheme for colored console output
 from core.utils.ColorScheme import ColorScheme
 
-from core.models.ai_model import get_embedder
-
 cs = ColorScheme()
-model = get_embedder("paraphrase-multilingual-MiniLM-L12-v2")
-
-HEADER_PATTERNS = [
-    r"^chapter\s+\d+.*$",  # e.g., "Chapter 2: ..."
-    r"^ai engineering.*$",  # book title repeating
-]
-
-FOOTER_PATTERNS = [
-    r"^\s*\d+\s*$",  # page numbers only
-    r"^\s*page\s+\d+\s*$",  # "Page 23"
-]
 
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 50
+# Chunks are embedded in windows of this size (one batched encode per window)
+EMBED_WINDOW = 256
+# Drop chunks at least minhash.DEDUP_THRESHOLD similar to a stored chunk or
+# an earlier chunk of the same file (repeated boilerplate)
+INGEST_DEDUP = False
 
 
-def remove_header_footer(text: str, header_patterns=None, footer_patterns=None) -> str:
+def insert_pdf(
+    file_path: str, conn, cursor, embedder=None, replace=False, dedup=INGEST_DEDUP
+):
     """
-    Remove headers and footers from the given text using regex patterns.
-    - `header_patterns`: list of regex patterns to match headers
-    - `footer_patterns`: list of regex patterns to match footers
+    Parse, chunk, embed and insert a PDF.
+    - `embedder`: model or EmbeddingService used for batched encoding
+      (defaults to the in-process model)
+    - `replace`: delete chunks previously ingested from this file, in the
+      same transaction, once the new chunks are inserted (if any chunk
+      fails, the whole run is rolled back and the old chunks are kept)
+    - `dedup`: skip near-duplicate chunks before they are embedded
+
+    Every chunk's MinHash signature is stored with it either way.
     """
-    if not text:
-        return ""
-
-    header_patterns = header_patterns or []
-    footer_patterns = footer_patterns or []
-
-    for pattern in header_patterns + footer_patterns:
-        text = re.sub(pattern, "", text, flags=re.MULTILINE | re.IGNORECASE)
-
-    return text.strip()
-
-
-def insert_pdf(file_path: str, conn, cursor):
     if not os.path.exists(file_path):
         print(f"{cs.RED}File does not exist: {file_path}{cs.RESET}")
         return False
@@ -68,6 +65,11 @@ def insert_pdf(file_path: str, conn, cursor):
         print(f"{cs.YELLOW}No elements extracted. Aborting.{cs.RESET}")
         return False
 
+    # Chunks from a previous ingestion of this file (see parse_pdf book_id)
+    previous_ids = (
+        source_document_ids(os.path.basename(file_path), cursor) if replace else []
+    )
+
     # Get meaningful sample for language detection
     meaningful_samples = []
     for element in raw_elements[:5]:  # Check first 5 elements
@@ -92,13 +94,6 @@ def insert_pdf(file_path: str, conn, cursor):
         pdf_language = "unknown"
         print(f"{cs.YELLOW}⚠️  Could not detect PDF language{cs.RESET}")
 
-    # Chunking with better settings
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,  # Smaller chunks for better quality
-        chunk_overlap=CHUNK_OVERLAP,
-        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""],
-    )
-
     # total_chunks = 0
     # successful_chunks = 0
     # skipped_chunks = 0
@@ -109,74 +104,86 @@ def insert_pdf(file_path: str, conn, cursor):
         "failed_inserts": 0,
         "skipped_short": 0,
         "skipped_quality": 0,
+        "skipped_duplicate": 0,
         "total_chunks_created": 0,
     }
 
     print(f"{cs.BLUE}📊 Processing {stats['total_elements']} elements...{cs.RESET}")
 
-    # Process elements
-    for i, element in enumerate(raw_elements):
-        content = element["raw_text"].strip()
-
-        # remove the header and footer and footer from each element
-        content = remove_header_footer(content, HEADER_PATTERNS, FOOTER_PATTERNS)
-
-        # Skip very short content
-        if len(content) < 15:
-            stats["skipped_short"] += 1
-            continue
+    # Process elements: cleaning and chunking happen in one streaming pass
+    chunks = iter_chunks(
+        raw_elements,
+        CHUNK_SIZE,
+        CHUNK_OVERLAP,
+        header_patterns=HEADER_PATTERNS,
+        footer_patterns=FOOTER_PATTERNS,
+        stats=stats,
+    )
+    embedder = embedder or get_model()
+    window = []
+    # Chunks being replaced are not duplicates of their new version
+    seen = load_minhash_index(cursor, exclude_ids=previous_ids) if dedup else None
+
+    def flush_window():
+        successful, failed = insert_documents(
+            window, conn, cursor, embedder, commit=False, silent=True
+        )
+        stats["successful_inserts"] += successful
+        stats["failed_inserts"] += failed
+        window.clear()
+        print(
+            f"  {cs.CYAN}🔄 Processed {stats['successful_inserts'] + stats['failed_inserts']} chunks...{cs.RESET}"
+        )
 
-        # Clean the text more aggressively
-        normalized_content = normalize_content(content)
-        if not normalized_content or len(normalized_content) < 15:
-            stats["skipped_short"] += 1
+    for chunk in chunks:
+        # Skip empty or low-quality chunks
+        if len(chunk["content"]) < 25:
+            stats["skipped_quality"] += 1
             continue
 
-        # Split into chunks
-        chunks = text_splitter.split_text(normalized_content)
-        stats["total_chunks_created"] += len(chunks)
-
-        for chunk_text in chunks:
-            chunk_text = chunk_text.strip()
-
-            # Skip empty or low-quality chunks
-
-            if len(chunk_text) < 25:
-                stats["skipped_quality"] += 1
-                continue
-
-            # clean_chunk = chunk_text
-            clean_chunk = normalize_content(chunk_text)
-            if len(clean_chunk) < 25:
-                stats["skipped_quality"] += 1
+        signature = minhash.signature(chunk["content"])
+        if seen is not None:
+            if seen.find_duplicate(signature) is not None:
+                stats["skipped_duplicate"] += 1
                 continue
+            seen.add(-len(seen) - 1, signature)  # not stored yet: negative key
+
+        # Chunk dicts carry book_id/page_number through to the document row
+        window.append({**chunk, "signature": signature})
+        if len(window) >= EMBED_WINDOW:
+            flush_window()
+
+    if window:
+        flush_window()
+
+    # Replace the previous version only if every new chunk was inserted;
+    # otherwise nothing of this run is kept
+    replaced_ids = []
+    if previous_ids:
+        if stats["successful_inserts"] > 0 and not stats["failed_inserts"]:
+            replaced_ids = delete_documents(
+                previous_ids, conn, cursor, commit=False, silent=True
+            )
+        if not replaced_ids:
+            conn.rollback()
+            print(
+                f"{cs.RED}❌ Re-ingest incomplete ({stats['successful_inserts']} inserted, "
+                f"{stats['failed_inserts']} failed); previous version kept.{cs.RESET}"
+            )
+            return False
 
-            current_total = stats["successful_inserts"] + stats["failed_inserts"]
-            if current_total > 0 and current_total % 50 == 0:
-                print(f"  {cs.CYAN}🔄 Processed {current_total} chunks...{cs.RESET}")
-
-            # Try to insert
-            if insert_document(
-                clean_chunk, conn, cursor, model, commit=False, silent=True
-            ):
-                stats["successful_inserts"] += 1
-            else:
-                stats["failed_inserts"] += 1
-
-            # Batch commit
-            # Show element progress every 20 elements
-            if (i + 1) % 20 == 0:
-                print(
-                    f"  {cs.BLUE}📝 Processed {i + 1}/{stats['total_elements']} elements...{cs.RESET}"
-                )
     # Final commit
     conn.commit()
+    if replaced_ids:
+        bm25_utils.remove_from_bm25_index(replaced_ids)
 
     # Display comprehensive summary
     print(f"\n{cs.CYAN}📊 PDF INGESTION SUMMARY{cs.RESET}")
     print(f"{cs.CYAN}{'=' * 50}{cs.RESET}")
     print(f"  📄 PDF File: {os.path.basename(file_path)}")
     print(f"  🌐 Primary Language: {pdf_language}")
+    if replace:
+        print(f"  ♻️  Replaced Chunks: {len(replaced_ids)}")
     print(f"  📝 Elements Processed: {stats['total_elements']}")
     print(f"  🧩 Chunks Created: {stats['total_chunks_created']}")
     print(f"{cs.CYAN}{'─' * 50}{cs.RESET}")
@@ -188,12 +195,17 @@ def insert_pdf(file_path: str, conn, cursor):
     print(
         f"  🗑️  {cs.YELLOW}Skipped (Low Quality): {stats['skipped_quality']}{cs.RESET}"
     )
+    if dedup:
+        print(
+            f"  ♊ {cs.YELLOW}Skipped (Near-duplicate): {stats['skipped_duplicate']}{cs.RESET}"
+        )
 
     total_processed = (
         stats["successful_inserts"]
         + stats["failed_inserts"]
         + stats["skipped_short"]
         + stats["skipped_quality"]
+        + stats["skipped_duplicate"]
     )
 
     success_rate = (
@@ -211,12 +223,21 @@ def insert_pdf(file_path: str, conn, cursor):
         print(
             f"\n🔄 Updating BM25 index with {stats['successful_inserts']} new documents..."
         )
-        update_bm25_index(cursor, normalize_content)
+        bm25_utils.update_bm25_index(cursor, normalize_content)
         print(f"{cs.GREEN}✅ BM25 index updated.{cs.RESET}")
     else:
-        print(f"\n{cs.YELLOW}⚠️  No documents inserted, skipping BM25 update.{cs.RESET}")
+        print(
+            f"\n{cs.YELLOW}⚠️  No documents inserted, skipping BM25 update.{cs.RESET}"
+        )
 
     return stats["successful_inserts"] > 0
 
 
+def reingest_pdf(file_path: str, conn, cursor, embedder=None, dedup=INGEST_DEDUP):
+    """Re-ingest a PDF, replacing the chunks stored from its previous version."""
+    return insert_pdf(
+        file_path, conn, cursor, embedder=embedder, replace=True, dedup=dedup
+    )
+
+
 # C:\Users\saboor\Desktop\random1.pdf
@@ -5,24 +5,24 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 # from curses import raw
 from db.db_connection import db_connection
-from db.database_operations import insert_document, search
+from db.database_operations import (
+    delete_documents,
+    delete_source,
+    get_model,
+    insert_document,
+    search,
+)
 
 # from db.database_operations import insert_document
-from models.ai_model import get_embedder
 
 from utils.helper_functions import go_back
 
-from ingestion.insert_pdf_chunks import insert_pdf
+from ingestion.insert_pdf_chunks import insert_pdf, reingest_pdf
 
 from core.utils.ColorScheme import ColorScheme
 
 cs = ColorScheme()
 
-# # Connect to DB
-conn = db_connection()
-cursor = conn.cursor() if conn else None
-model = get_embedder("paraphrase-multilingual-MiniLM-L12-v2")
-
 # main
 
 
@@ -35,6 +35,8 @@ def display_menu():
     print("  [I]nsert: Add new document text manually.")
     print("  [S]earch: Query and retrieve documents.")
     print("  [P]df:    Extract and insert from a PDF file.")
+    print("  [R]eingest: Re-insert a PDF, replacing its old chunks.")
+    print("  [D]elete: Remove documents by id or by PDF file name.")
     print("  [B]ack:   Go back to previous menu.")
     print("  [Q]uit:   Exit the program.")
     print("=" * 50)
@@ -47,7 +49,7 @@ def main_menu(conn, cursor, model):
         display_menu()
         action = (
             input(
-                f"{cs.GREEN}Your choice -> {cs.BOLD}[I - S - PDF - B - Q]{cs.UNDERLINE}: {cs.RESET}"
+                f"{cs.GREEN}Your choice -> {cs.BOLD}[I - S - PDF - R - D - B - Q]{cs.UNDERLINE}: {cs.RESET}"
             )
             .strip()
             .lower()
@@ -63,16 +65,37 @@ def main_menu(conn, cursor, model):
             query = input("Enter search query: ").strip()
             if go_back(query):
                 continue
-            search(query)
+            search(query, output="rich")
 
         elif action == "pdf":
             file_path = input("Enter PDF file path: ").strip()
             if go_back(file_path):
                 continue
             insert_pdf(file_path, conn, cursor)
+
+        elif action == "r":
+            file_path = input("Enter PDF file path: ").strip()
+            if go_back(file_path):
+                continue
+            reingest_pdf(file_path, conn, cursor)
+
+        elif action == "d":
+            target = input("Enter document ids (comma separated) or PDF name: ")
+            target = target.strip()
+            if go_back(target) or not target:
+                continue
+            ids = [part.strip() for part in target.split(",")]
+            if all(part.isdigit() for part in ids):
+                delete_documents([int(part) for part in ids], conn, cursor)
+            else:
+                delete_source(target, conn, cursor)
         elif action == "q":
             break
 
 
 if __name__ == "__main__":
-    main_menu(conn, cursor, model)
+    # Connect to DB here, not at import: EmbeddingService's spawn workers
+    # re-import this module as __mp_main__
+    conn = db_connection()
+    cursor = conn.cursor() if conn else None
+    main_menu(conn, cursor, get_model())
@@ -0,0 +1,150 @@
+import multiprocessing as mp
+import os
+
+from models.ai_model import get_embedder
+
+DEFAULT_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
+BATCH_SIZE = 32
+# Texts are grouped by word count in buckets this wide so a batch never
+# pads short sentences up to a long one.
+BUCKET_WIDTH = 16
+
+# Model replica owned by a pool worker (set by _init_worker)
+_worker_model = None
+
+
+def _init_worker(model_name, num_threads, ready):
+    global _worker_model
+    import torch
+
+    # One replica per process: pin intra-op threads so workers do not
+    # oversubscribe the cores between them.
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already set for this process
+    _worker_model = get_embedder(model_name)
+    ready.release()
+
+
+def _encode_batch(job):
+    positions, texts = job
+    vectors = _worker_model.encode(texts, batch_size=len(texts))
+    return positions, [vector.tolist() for vector in vectors]
+
+
+def length_batches(texts, batch_size=BATCH_SIZE, bucket_width=BUCKET_WIDTH):
+    """
+    Group texts into (positions, texts) batches of similar length.
+    Texts are sorted by word count and a batch never spans two buckets.
+    """
+    lengths = [len(text.split()) for text in texts]
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+
+    batches = []
+    positions = []
+    current_bucket = None
+    for i in order:
+        bucket = lengths[i] // bucket_width
+        if positions and (bucket != current_bucket or len(positions) == batch_size):
+            batches.append((positions, [texts[p] for p in positions]))
+            positions = []
+        current_bucket = bucket
+        positions.append(i)
+
+    if positions:
+        batches.append((positions, [texts[p] for p in positions]))
+    return batches
+
+
+class EmbeddingService:
+    """
+    Pool of worker processes, each holding one embedding model replica.
+
+    `encode(texts)` has the same shape as SentenceTransformer.encode for a
+    list input, so it can be passed anywhere a model is used for batches
+    (insert_documents, insert_pdf). With `num_workers <= 1` texts are
+    encoded in the calling process, still length-bucketed.
+    """
+
+    def __init__(
+        self,
+        model_name=DEFAULT_MODEL,
+        num_workers=None,
+        threads_per_worker=None,
+        batch_size=BATCH_SIZE,
+        bucket_width=BUCKET_WIDTH,
+    ):
+        cpu_count = os.cpu_count() or 1
+        self.num_workers = num_workers if num_workers is not None else cpu_count
+        self.threads_per_worker = threads_per_worker or max(
+            1, cpu_count // max(self.num_workers, 1)
+        )
+        self.batch_size = batch_size
+        self.bucket_width = bucket_width
+        self.model_name = model_name
+        self._model = None
+        self._pool = None
+        # Released once by each worker after its replica is loaded
+        self._ready = None
+        self._not_ready = 0
+
+        if self.num_workers > 1:
+            # spawn: forking a process that already initialized torch threads
+            # is unsafe
+            context = mp.get_context("spawn")
+            self._ready = context.Semaphore(0)
+            self._not_ready = self.num_workers
+            self._pool = context.Pool(
+                self.num_workers,
+                initializer=_init_worker,
+                initargs=(model_name, self.threads_per_worker, self._ready),
+            )
+        else:
+            self._model = get_embedder(model_name)
+
+    def wait_ready(self, timeout=None):
+        """
+        Block until every worker has loaded its model replica (the pool
+        starts them in the background). Raises TimeoutError after `timeout`
+        seconds.
+        """
+        while self._not_ready:
+            if not self._ready.acquire(timeout=timeout):
+                raise TimeoutError(
+                    f"{self._not_ready} embedding worker(s) still loading the model"
+                )
+            self._not_ready -= 1
+
+    def encode(self, texts):
+        """Return one embedding (list of floats) per input text, in order."""
+        if not texts:
+            return []
+
+        batches = length_batches(texts, self.batch_size, self.bucket_width)
+        results = [None] * len(texts)
+
+        if self._pool is None:
+            for positions, batch in batches:
+                vectors = self._model.encode(batch, batch_size=len(batch))
+                for position, vector in zip(positions, vectors):
+                    results[position] = vector.tolist()
+            return results
+
+        for positions, vectors in self._pool.imap_unordered(_encode_batch, batches):
+            for position, vector in zip(positions, vectors):
+                results[position] = vector
+        return results
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,81 @@
+import numpy as np
+
+# Coarse vectors are compared with cosine distance, so both methods return
+# unit-length projections.
+METHODS = ("pca", "truncate")
+
+
+def parse_vector(value):
+    """pgvector text ('[0.1,0.2,...]') or a sequence -> float32 array."""
+    if isinstance(value, str):
+        return np.array(value.strip("[]").split(","), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+class Projection:
+    """
+    Linear map from full embeddings to `dims` coarse dimensions.
+
+    - "pca": centre on the corpus mean and project on the top principal
+      components (works for any embedding model)
+    - "truncate": keep the first `dims` coordinates (Matryoshka-trained
+      models put the most information there)
+    """
+
+    def __init__(self, method, mean, components):
+        if method not in METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        self.method = method
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.asarray(components, dtype=np.float32)
+
+    @property
+    def dims(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors, dims, method="pca"):
+        """Fit on a sample of full embeddings (rows of `vectors`)."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or not len(vectors):
+            raise ValueError("No embeddings to fit the projection on")
+        full_dims = vectors.shape[1]
+        if not 0 < dims <= full_dims:
+            raise ValueError(f"dims must be between 1 and {full_dims}, got {dims}")
+
+        if method == "truncate":
+            return cls(method, np.zeros(full_dims), np.eye(dims, full_dims))
+
+        if method not in METHODS:
+            raise ValueError(f"Unknown projection method: {method}")
+        mean = vectors.mean(axis=0)
+        # Rows of vt are the principal axes, strongest first
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        components = vt[:dims]
+        if len(components) < dims:
+            raise ValueError(f"Need at least {dims} embeddings to fit {dims} dims")
+        return cls(method, mean, components)
+
+    def project(self, vectors):
+        """Project a batch of full embeddings; returns a (n, dims) array."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return _normalize((vectors - self.mean) @ self.components.T)
+
+    def project_one(self, vector):
+        """Coarse vector (list of floats) for one full embedding."""
+        return self.project(parse_vector(vector)[None, :])[0].tolist()
+
+    def to_bytes(self):
+        return self.mean.tobytes(), self.components.tobytes()
+
+    @classmethod
+    def from_bytes(cls, method, dims, mean, components):
+        mean = np.frombuffer(bytes(mean), dtype=np.float32)
+        components = np.frombuffer(bytes(components), dtype=np.float32)
+        return cls(method, mean, components.reshape(dims, len(mean)))
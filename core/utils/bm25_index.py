@@ -0,0 +1,679 @@
+import heapq
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+
+# Merge all segments once there are more than this many ...
+MAX_SEGMENTS = 8
+# ... or once this fraction of indexed documents is tombstoned
+COMPACT_DELETED_RATIO = 0.2
+
+# Filters accepted by search() and BM25Index.get_scores()
+FILTER_KEYS = (
+    "language",
+    "source",
+    "page_from",
+    "page_to",
+    "created_after",
+    "created_before",
+)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+def _as_timestamp(value):
+    """datetime/date/ISO string -> POSIX timestamp (None passes through)."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    return value.timestamp()
+
+
+def _as_datetime(value, end_of_day=False):
+    """
+    datetime, date or ISO string -> datetime. A bare date means its first
+    instant, or with `end_of_day` its last (so an inclusive upper bound
+    keeps the whole day).
+    """
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value)
+        except ValueError:
+            return datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value
+    start = datetime(value.year, value.month, value.day)
+    return start + timedelta(days=1, microseconds=-1) if end_of_day else start
+
+
+def _as_page(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None  # parse_pdf reports "N/A" when the page is unknown
+
+
+def normalize_filters(filters):
+    """
+    Validate a search filter dict and coerce its values.
+    - language / source: a value or a list of values
+    - page_from / page_to: inclusive page range
+    - created_after / created_before: datetime, date or ISO string
+      (inclusive; a date alone covers the whole day)
+    """
+    if not filters:
+        return {}
+
+    unknown = set(filters) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(
+            f"Unknown search filter(s): {', '.join(sorted(unknown))}. "
+            f"Expected: {', '.join(FILTER_KEYS)}"
+        )
+
+    normalized = {}
+    for key in ("language", "source"):
+        values = _as_list(filters.get(key))
+        if values:
+            normalized[key] = values
+    for key in ("page_from", "page_to"):
+        if filters.get(key) is not None:
+            normalized[key] = int(filters[key])
+    for key in ("created_after", "created_before"):
+        if filters.get(key) is not None:
+            normalized[key] = _as_datetime(
+                filters[key], end_of_day=key == "created_before"
+            )
+    return normalized
+
+
+def compute_idf(doc_freq, corpus_size, epsilon):
+    """
+    BM25Okapi idf: log((N - df + 0.5) / (df + 0.5)), with negative values
+    floored to `epsilon` times the average idf of the vocabulary.
+    """
+    idf = {}
+    idf_sum = 0
+    negative_idfs = []
+    for term, freq in doc_freq.items():
+        value = math.log(corpus_size - freq + 0.5) - math.log(freq + 0.5)
+        idf[term] = value
+        idf_sum += value
+        if value < 0:
+            negative_idfs.append(term)
+
+    if idf:
+        eps = epsilon * idf_sum / len(idf)
+        for term in negative_idfs:
+            idf[term] = eps
+    return idf
+
+
+def _bitset(positions, size):
+    """Pack document positions into an int bitset (built via bytes, O(k))."""
+    buffer = bytearray((size + 7) // 8)
+    for pos in positions:
+        buffer[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def _range_positions(sorted_values, sorted_positions, low, high):
+    start = 0 if low is None else bisect_left(sorted_values, low)
+    end = len(sorted_values) if high is None else bisect_right(sorted_values, high)
+    return sorted_positions[start:end]
+
+
+class BM25Segment:
+    """
+    Immutable postings for one batch of documents plus a tombstone bitset.
+    Deleting a document only sets its tombstone bit; postings are dropped
+    when segments are merged by BM25Index.compact().
+    """
+
+    def __init__(self):
+        self.doc_ids = []
+        self.contents = []
+        self.languages = []
+        self.book_ids = []
+        self.pages = []
+        self.created_at = []
+        self.doc_len = array("I")
+        self.postings = {}  # term -> (array of positions, array of tf)
+        self.tombstones = bytearray()  # one bit per position
+        self.deleted_count = 0
+        self._deleted_bits = None
+
+    @classmethod
+    def from_documents(cls, docs):
+        """
+        Build a segment from (doc_id, tokens, metadata) tuples where metadata
+        holds `content`, `language`, `book_id`, `page_number`, `created_at`.
+        """
+        segment = cls()
+        for pos, (doc_id, tokens, meta) in enumerate(docs):
+            segment._append_metadata(doc_id, len(tokens), meta)
+
+            frequencies = {}
+            for token in tokens:
+                frequencies[token] = frequencies.get(token, 0) + 1
+            for token, tf in frequencies.items():
+                posting = segment.postings.get(token)
+                if posting is None:
+                    posting = segment.postings[token] = (array("I"), array("I"))
+                posting[0].append(pos)
+                posting[1].append(tf)
+
+        segment._build_lookups()
+        return segment
+
+    @classmethod
+    def merge(cls, segments):
+        """Merge segments into one, dropping tombstoned documents."""
+        merged = cls()
+        remaps = []
+        for segment in segments:
+            remap = []
+            for pos in range(segment.size):
+                if segment.is_deleted(pos):
+                    remap.append(-1)
+                    continue
+                remap.append(merged.size)
+                merged._append_metadata(
+                    segment.doc_ids[pos],
+                    segment.doc_len[pos],
+                    {
+                        "content": segment.contents[pos],
+                        "language": segment.languages[pos],
+                        "book_id": segment.book_ids[pos],
+                        "page_number": segment.pages[pos],
+                        "created_at": segment.created_at[pos],
+                    },
+                )
+            remaps.append(remap)
+
+        # Segments are visited in order, so merged postings stay sorted
+        for segment, remap in zip(segments, remaps):
+            for term, (positions, tfs) in segment.postings.items():
+                target = None
+                for pos, tf in zip(positions, tfs):
+                    new_pos = remap[pos]
+                    if new_pos < 0:
+                        continue
+                    if target is None:
+                        target = merged.postings.get(term)
+                        if target is None:
+                            target = merged.postings[term] = (array("I"), array("I"))
+                    target[0].append(new_pos)
+                    target[1].append(tf)
+
+        merged._build_lookups()
+        return merged
+
+    def _append_metadata(self, doc_id, length, meta):
+        self.doc_ids.append(doc_id)
+        self.doc_len.append(length)
+        self.contents.append(meta.get("content"))
+        self.languages.append(meta.get("language"))
+        self.book_ids.append(meta.get("book_id"))
+        self.pages.append(_as_page(meta.get("page_number")))
+        self.created_at.append(meta.get("created_at"))
+
+    def _build_lookups(self):
+        self.tombstones = bytearray((self.size + 7) // 8)
+        self.position_of = {doc_id: pos for pos, doc_id in enumerate(self.doc_ids)}
+
+        language_positions = {}
+        source_positions = {}
+        for pos, (language, book_id) in enumerate(zip(self.languages, self.book_ids)):
+            language_positions.setdefault(language, []).append(pos)
+            source_positions.setdefault(book_id, []).append(pos)
+        self.language_bits = {
+            key: _bitset(positions, self.size)
+            for key, positions in language_positions.items()
+        }
+        self.source_bits = {
+            key: _bitset(positions, self.size)
+            for key, positions in source_positions.items()
+        }
+
+        pages = sorted(
+            (page, pos) for pos, page in enumerate(self.pages) if page is not None
+        )
+        created = sorted(
+            (_as_timestamp(value), pos)
+            for pos, value in enumerate(self.created_at)
+            if value is not None
+        )
+        self._page_values = [value for value, _ in pages]
+        self._page_positions = [pos for _, pos in pages]
+        self._created_values = [value for value, _ in created]
+        self._created_positions = [pos for _, pos in created]
+
+    @property
+    def size(self):
+        return len(self.doc_ids)
+
+    @property
+    def total_len(self):
+        return sum(self.doc_len)
+
+    def is_deleted(self, pos):
+        return bool(self.tombstones[pos >> 3] >> (pos & 7) & 1)
+
+    def deleted_bits(self):
+        """Tombstones as an int bitset (cached until the next delete)."""
+        if self._deleted_bits is None:
+            self._deleted_bits = int.from_bytes(self.tombstones, "little")
+        return self._deleted_bits
+
+    def delete(self, doc_id):
+        """Tombstone `doc_id`. Returns False if it is not live here."""
+        pos = self.position_of.get(doc_id)
+        if pos is None or self.is_deleted(pos):
+            return False
+        self.tombstones[pos >> 3] |= 1 << (pos & 7)
+        self.deleted_count += 1
+        self._deleted_bits = None
+        return True
+
+    def filter_mask(self, filters):
+        """
+        Bitset (int) of live documents matching normalized `filters`, or
+        None when every document in the segment is eligible.
+        """
+        if not filters and not self.deleted_count:
+            return None
+
+        mask = (1 << self.size) - 1
+        if "language" in filters:
+            bits = 0
+            for language in filters["language"]:
+                bits |= self.language_bits.get(language, 0)
+            mask &= bits
+        if "source" in filters:
+            bits = 0
+            for source in filters["source"]:
+                bits |= self.source_bits.get(source, 0)
+            mask &= bits
+        if "page_from" in filters or "page_to" in filters:
+            positions = _range_positions(
+                self._page_values,
+                self._page_positions,
+                filters.get("page_from"),
+                filters.get("page_to"),
+            )
+            mask &= _bitset(positions, self.size)
+        if "created_after" in filters or "created_before" in filters:
+            positions = _range_positions(
+                self._created_values,
+                self._created_positions,
+                _as_timestamp(filters.get("created_after")),
+                _as_timestamp(filters.get("created_before")),
+            )
+            mask &= _bitset(positions, self.size)
+        return mask & ~self.deleted_bits()
+
+    def allowed_bytes(self, mask):
+        """`mask` as bytes for per-position bit tests (None: no restriction)."""
+        if mask is None:
+            return None
+        return mask.to_bytes((self.size + 7) // 8, "little")
+
+    def score_term(
+        self, token, weight, k1, norm_a, norm_b, scores, allowed=None, admit=True
+    ):
+        """
+        Add one query term's contribution to `scores` ({position: score}) in
+        place. With `admit=False` only positions already in `scores` are
+        updated, by binary search when that beats scanning the posting.
+        """
+        posting = self.postings.get(token)
+        if posting is None:
+            return
+        positions, tfs = posting
+        doc_len = self.doc_len
+
+        if admit:
+            for pos, tf in zip(positions, tfs):
+                if allowed is not None and not allowed[pos >> 3] >> (pos & 7) & 1:
+                    continue
+                score = weight * tf * (k1 + 1) / (tf + norm_a + norm_b * doc_len[pos])
+                scores[pos] = scores.get(pos, 0) + score
+        elif len(scores) * 16 < len(positions):
+            size = len(positions)
+            for pos in scores:
+                i = bisect_left(positions, pos)
+                if i < size and positions[i] == pos:
+                    tf = tfs[i]
+                    scores[pos] += (
+                        weight * tf * (k1 + 1) / (tf + norm_a + norm_b * doc_len[pos])
+                    )
+        else:
+            for pos, tf in zip(positions, tfs):
+                if pos in scores:
+                    scores[pos] += (
+                        weight * tf * (k1 + 1) / (tf + norm_a + norm_b * doc_len[pos])
+                    )
+
+    def score(self, query_counts, idf, k1, norm_a, norm_b, mask=None):
+        """
+        Score documents containing at least one query token.
+        Returns {position: score}; positions outside `mask` are skipped
+        before scoring.
+        """
+        allowed = None
+        if mask is not None:
+            if not mask:
+                return {}
+            allowed = mask.to_bytes((self.size + 7) // 8, "little")
+
+        doc_len = self.doc_len
+        scores = {}
+        for token, count in query_counts.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            # Repeated query tokens weigh more, as in BM25Okapi
+            weight = idf[token] * count
+            for pos, tf in zip(*posting):
+                if allowed is not None and not allowed[pos >> 3] >> (pos & 7) & 1:
+                    continue
+                score = weight * tf * (k1 + 1) / (tf + norm_a + norm_b * doc_len[pos])
+                scores[pos] = scores.get(pos, 0) + score
+        return scores
+
+
+class BM25Index:
+    """
+    Segmented inverted BM25 index with per-filter bitsets.
+
+    Scores match rank_bm25.BM25Okapi (same idf with epsilon floor) but only
+    documents present in a term's postings are touched, and filters are
+    applied before a posting is scored.
+
+    New documents are appended as a segment and deletes set tombstones, so
+    neither needs a corpus reload. Corpus statistics (N, document
+    frequencies, average length) still count tombstoned documents until
+    compact() merges the segments; that happens automatically once there
+    are more than `max_segments` segments or `compact_ratio` of the indexed
+    documents are deleted.
+    """
+
+    def __init__(
+        self,
+        docs=(),
+        k1=1.5,
+        b=0.75,
+        epsilon=0.25,
+        max_segments=MAX_SEGMENTS,
+        compact_ratio=COMPACT_DELETED_RATIO,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.max_segments = max_segments
+        self.compact_ratio = compact_ratio
+
+        self.segments = []
+        self._reset_stats()
+        if docs:
+            self.add_documents(docs)
+
+    def _reset_stats(self):
+        self.corpus_size = 0
+        self.total_len = 0
+        self.doc_freq = {}
+        self._idf = None
+
+    def _add_stats(self, segment):
+        self.corpus_size += segment.size
+        self.total_len += segment.total_len
+        doc_freq = self.doc_freq
+        for term, (positions, _) in segment.postings.items():
+            doc_freq[term] = doc_freq.get(term, 0) + len(positions)
+        self._idf = None
+
+    @property
+    def avgdl(self):
+        return self.total_len / self.corpus_size if self.corpus_size else 0
+
+    @property
+    def deleted_count(self):
+        return sum(segment.deleted_count for segment in self.segments)
+
+    @property
+    def live_count(self):
+        return self.corpus_size - self.deleted_count
+
+    @property
+    def idf(self):
+        """Same idf (with epsilon floor for negative values) as BM25Okapi."""
+        if self._idf is None:
+            self._idf = compute_idf(self.doc_freq, self.corpus_size, self.epsilon)
+        return self._idf
+
+    def stats(self):
+        """Corpus statistics a coordinator sums across shards for global idf."""
+        return {
+            "corpus_size": self.corpus_size,
+            "total_len": self.total_len,
+            "deleted_count": self.deleted_count,
+            "doc_freq": self.doc_freq,
+        }
+
+    def add_documents(self, docs):
+        """Append (doc_id, tokens, metadata) tuples as a new segment."""
+        segment = BM25Segment.from_documents(docs)
+        if not segment.size:
+            return 0
+        self.segments.append(segment)
+        self._add_stats(segment)
+        self.maybe_compact()
+        return segment.size
+
+    def delete(self, doc_ids):
+        """Tombstone documents so scoring skips them. Returns the count."""
+        deleted = 0
+        for doc_id in doc_ids:
+            # Newest segment first: an updated document is live only there
+            for segment in reversed(self.segments):
+                if segment.delete(doc_id):
+                    deleted += 1
+                    break
+        if deleted:
+            self.maybe_compact()
+        return deleted
+
+    def maybe_compact(self):
+        deleted = self.deleted_count
+        if len(self.segments) > self.max_segments or (
+            deleted and deleted > self.compact_ratio * self.corpus_size
+        ):
+            self.compact()
+
+    def compact(self):
+        """Merge all segments, purge tombstones and refresh statistics."""
+        merged = BM25Segment.merge(self.segments)
+        self.segments = [merged] if merged.size else []
+        self._reset_stats()
+        for segment in self.segments:
+            self._add_stats(segment)
+
+    def document(self, doc_id):
+        """Metadata dict of a live document, or None."""
+        for segment in reversed(self.segments):
+            pos = segment.position_of.get(doc_id)
+            if pos is not None and not segment.is_deleted(pos):
+                return {
+                    "content": segment.contents[pos],
+                    "language": segment.languages[pos],
+                    "book_id": segment.book_ids[pos],
+                    "page_number": segment.pages[pos],
+                    "created_at": segment.created_at[pos],
+                }
+        return None
+
+    def documents(self, doc_ids):
+        """{doc_id: metadata} for the live documents among `doc_ids`."""
+        found = {}
+        for doc_id in doc_ids:
+            doc = self.document(doc_id)
+            if doc is not None:
+                found[doc_id] = doc
+        return found
+
+    def get_scores(self, query_tokens, filters=None, idf=None, avgdl=None):
+        """
+        Score live documents containing at least one query token.
+        Returns {doc_id: score}. `filters` (see normalize_filters) are
+        applied before scoring. `idf`/`avgdl` override this index's own
+        statistics (used by shards scoring with global statistics).
+        """
+        filters = normalize_filters(filters)
+        if not self.corpus_size:
+            return {}
+
+        query_counts = {}
+        for token in query_tokens:
+            query_counts[token] = query_counts.get(token, 0) + 1
+
+        idf = self.idf if idf is None else idf
+        avgdl = self.avgdl if avgdl is None else avgdl
+        k1 = self.k1
+        norm_a = k1 * (1 - self.b)
+        norm_b = k1 * self.b / avgdl if avgdl else 0
+
+        scores = {}
+        for segment in self.segments:
+            mask = segment.filter_mask(filters)
+            segment_scores = segment.score(query_counts, idf, k1, norm_a, norm_b, mask)
+            doc_ids = segment.doc_ids
+            for pos, score in segment_scores.items():
+                scores[doc_ids[pos]] = score
+        return scores
+
+    def top_scores(
+        self, query_tokens, k, filters=None, include_ids=(), idf=None, avgdl=None
+    ):
+        """
+        Positive BM25 scores for the `k` best documents, plus any of
+        `include_ids` that match (so fusion with another ranked list stays
+        exact). Returns ({doc_id: score}, number of documents with score > 0).
+        """
+        scores = self.get_scores(query_tokens, filters, idf, avgdl)
+        positive = [(doc_id, score) for doc_id, score in scores.items() if score > 0]
+
+        top = dict(heapq.nlargest(k, positive, key=lambda item: item[1]))
+        for doc_id in include_ids:
+            score = scores.get(doc_id, 0)
+            if score > 0:
+                top[doc_id] = score
+        return top, len(positive)
+
+    def pruned_top_scores(
+        self,
+        query_tokens,
+        k,
+        filters=None,
+        include_ids=(),
+        idf=None,
+        avgdl=None,
+        deadline=None,
+    ):
+        """
+        top_scores() without scoring every matching document.
+
+        Terms are scored highest weight first. Once the k-th best partial
+        score (less what the remaining negative-weight terms could take
+        away) reaches the most the remaining terms could add, no document
+        not yet scored can reach the top k, so later terms only update
+        documents already scored. `include_ids` are always scored.
+
+        If `deadline` (a time.time() value) passes while documents are still
+        being admitted, admission stops early. Returns
+        ({doc_id: score}, documents scored, complete); the top k is exact
+        when `complete` is True.
+        """
+        filters = normalize_filters(filters)
+        if not self.corpus_size:
+            return {}, 0, True
+
+        query_counts = {}
+        for token in query_tokens:
+            query_counts[token] = query_counts.get(token, 0) + 1
+
+        idf = self.idf if idf is None else idf
+        avgdl = self.avgdl if avgdl is None else avgdl
+        k1 = self.k1
+        norm_a = k1 * (1 - self.b)
+        norm_b = k1 * self.b / avgdl if avgdl else 0
+
+        # A term adds at most weight * (k1 + 1) to a document's score
+        weights = {
+            token: idf[token] * count
+            for token, count in query_counts.items()
+            if token in idf
+        }
+        terms = sorted(weights, key=weights.get, reverse=True)
+        gain = sum(max(w, 0) for w in weights.values()) * (k1 + 1)
+        loss = sum(min(w, 0) for w in weights.values()) * (k1 + 1)
+
+        segments = self.segments
+        allowed = [
+            segment.allowed_bytes(segment.filter_mask(filters)) for segment in segments
+        ]
+        scores = [{} for _ in segments]
+        for doc_id in include_ids:
+            for i, segment in enumerate(segments):
+                pos = segment.position_of.get(doc_id)
+                if pos is None or segment.is_deleted(pos):
+                    continue
+                bits = allowed[i]
+                if bits is None or bits[pos >> 3] >> (pos & 7) & 1:
+                    scores[i][pos] = 0
+                break
+
+        admit = k > 0
+        complete = True
+        for n, token in enumerate(terms):
+            weight = weights[token]
+            for segment, segment_scores, bits in zip(segments, scores, allowed):
+                segment.score_term(
+                    token, weight, k1, norm_a, norm_b, segment_scores, bits, admit
+                )
+            gain -= max(weight, 0) * (k1 + 1)
+            loss -= min(weight, 0) * (k1 + 1)
+
+            if not admit or n == len(terms) - 1:
+                continue
+            if deadline is not None and time.time() > deadline:
+                admit = complete = False
+                continue
+            kth = heapq.nlargest(
+                k, (score for part in scores for score in part.values())
+            )
+            admit = len(kth) < k or kth[-1] + loss < gain
+
+        merged = {}
+        for segment, segment_scores in zip(segments, scores):
+            doc_ids = segment.doc_ids
+            for pos, score in segment_scores.items():
+                if score > 0:
+                    merged[doc_ids[pos]] = score
+
+        top = dict(heapq.nlargest(k, merged.items(), key=lambda item: item[1]))
+        for doc_id in include_ids:
+            if doc_id in merged:
+                top[doc_id] = merged[doc_id]
+        return top, len(merged), complete
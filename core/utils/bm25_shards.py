@@ -0,0 +1,398 @@
+import heapq
+import math
+import multiprocessing as mp
+import os
+from bisect import bisect_right
+
+from core.utils.bm25_index import (
+    COMPACT_DELETED_RATIO,
+    MAX_SEGMENTS,
+    BM25Index,
+    compute_idf,
+    normalize_filters,
+)
+
+DEFAULT_SHARDS = os.cpu_count() or 1
+
+
+def _start_context():
+    # fork where available: spawn would re-run the caller's __main__ (DB
+    # connection, model load) in every shard. Shards never touch torch or
+    # the inherited connection and exit through os._exit.
+    if "fork" in mp.get_all_start_methods():
+        return mp.get_context("fork")
+    return mp.get_context("spawn")
+
+
+def _doc_freq_delta(docs):
+    delta = {}
+    for _, tokens, _ in docs:
+        for term in set(tokens):
+            delta[term] = delta.get(term, 0) + 1
+    return delta
+
+
+def _apply(index, change):
+    """
+    Run `change(index)`, which returns (count, docs added), and report the
+    count and the shard's statistics with the document-frequency change it
+    caused, so the coordinator never has to receive a whole shard vocabulary.
+    """
+    doc_freq = index.doc_freq
+    count, added = change(index)
+    delta = _doc_freq_delta(added) if added else {}
+
+    if index.doc_freq is not doc_freq:
+        # compact() rebuilt the statistics without the tombstoned documents
+        current = index.doc_freq
+        for term, freq in doc_freq.items():
+            change = current.get(term, 0) - freq
+            if change:
+                delta[term] = delta.get(term, 0) + change
+
+    return {
+        "count": count,
+        "corpus_size": index.corpus_size,
+        "total_len": index.total_len,
+        "deleted_count": index.deleted_count,
+        "doc_freq_delta": delta,
+    }
+
+
+def _shard_worker(pipe, normalize_content, remove_stopwords):
+    """Command loop of one shard process. Replies ("ok", value) or ("error", exc)."""
+    from core.utils.bm25_utils import _tokenize_rows
+
+    def tokenize_rows(rows):
+        return _tokenize_rows(rows, normalize_content, remove_stopwords)
+
+    def add(rows):
+        def change(index):
+            docs = tokenize_rows(rows)
+            return index.add_documents(docs), docs
+
+        return change
+
+    def new_index():
+        # Compaction changes corpus statistics, so only the coordinator
+        # decides when it happens (for all shards at once)
+        return BM25Index(max_segments=math.inf, compact_ratio=math.inf)
+
+    index = new_index()
+    while True:
+        command, args = pipe.recv()
+        try:
+            if command == "close":
+                pipe.send(("ok", None))
+                break
+            elif command == "load":
+                index = new_index()
+                value = _apply(index, add(args[0]))
+            elif command == "append":
+                value = _apply(index, add(args[0]))
+            elif command == "delete":
+                value = _apply(index, lambda index: (index.delete(args[0]), None))
+            elif command == "compact":
+                value = _apply(index, lambda index: (index.compact(), None))
+            elif command == "top_scores":
+                value = index.top_scores(*args)
+            elif command == "pruned_top_scores":
+                value = index.pruned_top_scores(*args)
+            elif command == "documents":
+                value = index.documents(args[0])
+            else:
+                raise ValueError(f"Unknown shard command: {command}")
+            pipe.send(("ok", value))
+        except Exception as e:
+            pipe.send(("error", e))
+
+
+class ShardedBM25Index:
+    """
+    BM25 index partitioned by document id range over worker processes.
+
+    Each shard holds a BM25Index for its id range and scores its own
+    postings in parallel with the others; the coordinator keeps the global
+    corpus statistics and sends every query the idf of its terms, so scores
+    are identical to a single BM25Index over the whole corpus. Shards return
+    their local top-k and the coordinator merges them.
+
+    Shards never compact on their own: the coordinator applies
+    BM25Index's MAX_SEGMENTS / COMPACT_DELETED_RATIO rules to the global
+    counts and compacts every shard at once, so tombstoned documents leave
+    the statistics at the same point as in a single BM25Index.
+
+    Ranges are balanced by document count on load(); documents added later
+    (ids above the last range start) go to the last shard until the next
+    load.
+    """
+
+    def __init__(
+        self,
+        normalize_content,
+        num_shards=DEFAULT_SHARDS,
+        remove_stopwords=True,
+        epsilon=0.25,
+        max_segments=MAX_SEGMENTS,
+        compact_ratio=COMPACT_DELETED_RATIO,
+    ):
+        self.num_shards = max(1, num_shards)
+        self.epsilon = epsilon
+        self.max_segments = max_segments
+        self.compact_ratio = compact_ratio
+        self.bounds = []  # first doc id of shards 1..N-1
+        # Segments a single BM25Index would hold (one per non-empty append)
+        self.segment_count = 0
+
+        context = _start_context()
+        self._pipes = []
+        self._processes = []
+        for _ in range(self.num_shards):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_shard_worker,
+                args=(child, normalize_content, remove_stopwords),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self._pipes.append(parent)
+            self._processes.append(process)
+
+        self._shard_stats = [None] * self.num_shards
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.corpus_size = 0
+        self.total_len = 0
+        self.deleted_count = 0
+        self.doc_freq = {}
+        self._idf = None
+
+    # --- shard messaging ---
+
+    def _call(self, requests):
+        """Send {shard: (command, args)} to all shards first, then collect."""
+        for shard, request in requests.items():
+            self._pipes[shard].send(request)
+
+        replies = {}
+        error = None
+        for shard in requests:
+            status, value = self._pipes[shard].recv()
+            if status == "error":
+                error = value
+            replies[shard] = value
+        if error is not None:
+            raise error
+        return replies
+
+    def _update_stats(self, replies):
+        for shard, stats in replies.items():
+            self._shard_stats[shard] = stats
+            doc_freq = self.doc_freq
+            for term, change in stats["doc_freq_delta"].items():
+                freq = doc_freq.get(term, 0) + change
+                if freq > 0:
+                    doc_freq[term] = freq
+                else:
+                    doc_freq.pop(term, None)
+            if stats["doc_freq_delta"]:
+                self._idf = None
+
+        shard_stats = [stats for stats in self._shard_stats if stats]
+        corpus_size = sum(stats["corpus_size"] for stats in shard_stats)
+        if corpus_size != self.corpus_size:
+            self._idf = None
+        self.corpus_size = corpus_size
+        self.total_len = sum(stats["total_len"] for stats in shard_stats)
+        self.deleted_count = sum(stats["deleted_count"] for stats in shard_stats)
+
+    def shard_of(self, doc_id):
+        return bisect_right(self.bounds, doc_id)
+
+    def _partition(self, items, key=lambda item: item):
+        parts = {}
+        for item in items:
+            parts.setdefault(self.shard_of(key(item)), []).append(item)
+        return parts
+
+    # --- statistics ---
+
+    @property
+    def avgdl(self):
+        return self.total_len / self.corpus_size if self.corpus_size else 0
+
+    @property
+    def live_count(self):
+        return self.corpus_size - self.deleted_count
+
+    @property
+    def idf(self):
+        if self._idf is None:
+            self._idf = compute_idf(self.doc_freq, self.corpus_size, self.epsilon)
+        return self._idf
+
+    # --- updates (rows as selected by bm25_utils._SELECT_DOCUMENTS) ---
+
+    def load(self, rows):
+        """Replace the whole index, splitting rows into equal id ranges."""
+        rows = sorted(rows, key=lambda row: row[0])
+        step = len(rows) / self.num_shards
+        self.bounds = (
+            [rows[int(i * step)][0] for i in range(1, self.num_shards)] if rows else []
+        )
+
+        parts = self._partition(rows, key=lambda row: row[0])
+        self._reset_stats()
+        self._shard_stats = [None] * self.num_shards
+        replies = self._call(
+            {
+                shard: ("load", (parts.get(shard, []),))
+                for shard in range(self.num_shards)
+            }
+        )
+        self._update_stats(replies)
+        count = sum(stats["count"] for stats in replies.values())
+        self.segment_count = 1 if count else 0
+        return count
+
+    def add_rows(self, rows):
+        """Append rows to the shards owning their ids. Returns the count added."""
+        parts = self._partition(rows, key=lambda row: row[0])
+        replies = self._call(
+            {shard: ("append", (part,)) for shard, part in parts.items()}
+        )
+        self._update_stats(replies)
+        added = sum(stats["count"] for stats in replies.values())
+        if added:
+            self.segment_count += 1
+            self.maybe_compact()
+        return added
+
+    def delete(self, doc_ids):
+        """Tombstone documents in their shards. Returns the count deleted."""
+        parts = self._partition(doc_ids)
+        replies = self._call(
+            {shard: ("delete", (part,)) for shard, part in parts.items()}
+        )
+        self._update_stats(replies)
+        deleted = sum(stats["count"] for stats in replies.values())
+        if deleted:
+            self.maybe_compact()
+        return deleted
+
+    def maybe_compact(self):
+        """BM25Index.maybe_compact() on the global counts."""
+        deleted = self.deleted_count
+        if self.segment_count > self.max_segments or (
+            deleted and deleted > self.compact_ratio * self.corpus_size
+        ):
+            self.compact()
+
+    def compact(self):
+        """Compact every shard, purging tombstones from the statistics."""
+        self._update_stats(
+            self._call({shard: ("compact", ()) for shard in range(self.num_shards)})
+        )
+        self.segment_count = 1 if self.corpus_size else 0
+
+    # --- queries ---
+
+    def _query(self, command, query_tokens, k, filters, include_ids, *extra):
+        filters = normalize_filters(filters)
+        idf = self.idf
+        query_idf = {token: idf.get(token, 0) for token in set(query_tokens)}
+        include_parts = self._partition(include_ids)
+        return self._call(
+            {
+                shard: (
+                    command,
+                    (
+                        query_tokens,
+                        k,
+                        filters,
+                        include_parts.get(shard, ()),
+                        query_idf,
+                        self.avgdl,
+                        *extra,
+                    ),
+                )
+                for shard in range(self.num_shards)
+            }
+        )
+
+    @staticmethod
+    def _merge_top(scores, k, include_ids):
+        top = dict(heapq.nlargest(k, scores.items(), key=lambda item: item[1]))
+        for doc_id in include_ids:
+            if doc_id in scores:
+                top[doc_id] = scores[doc_id]
+        return top
+
+    def top_scores(self, query_tokens, k, filters=None, include_ids=()):
+        """
+        Same contract as BM25Index.top_scores, scored in parallel by all
+        shards with global statistics.
+        """
+        if not self.corpus_size:
+            return {}, 0
+
+        scores = {}
+        matched = 0
+        replies = self._query("top_scores", query_tokens, k, filters, include_ids)
+        for shard_scores, shard_matched in replies.values():
+            scores.update(shard_scores)
+            matched += shard_matched
+        return self._merge_top(scores, k, include_ids), matched
+
+    def pruned_top_scores(
+        self, query_tokens, k, filters=None, include_ids=(), deadline=None
+    ):
+        """Same contract as BM25Index.pruned_top_scores, per shard in parallel."""
+        if not self.corpus_size:
+            return {}, 0, True
+
+        scores = {}
+        scored = 0
+        complete = True
+        replies = self._query(
+            "pruned_top_scores", query_tokens, k, filters, include_ids, deadline
+        )
+        for shard_scores, shard_scored, shard_complete in replies.values():
+            scores.update(shard_scores)
+            scored += shard_scored
+            complete = complete and shard_complete
+        return self._merge_top(scores, k, include_ids), scored, complete
+
+    def documents(self, doc_ids):
+        """{doc_id: metadata} for the live documents among `doc_ids`."""
+        parts = self._partition(doc_ids)
+        found = {}
+        for shard_found in self._call(
+            {shard: ("documents", (part,)) for shard, part in parts.items()}
+        ).values():
+            found.update(shard_found)
+        return found
+
+    def document(self, doc_id):
+        return self.documents([doc_id]).get(doc_id)
+
+    def close(self):
+        for pipe, process in zip(self._pipes, self._processes):
+            if process.is_alive():
+                try:
+                    pipe.send(("close", None))
+                    pipe.recv()
+                except (BrokenPipeError, EOFError):
+                    pass
+            process.join(timeout=5)
+            pipe.close()
+        self._pipes = []
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,40 +1,221 @@
-from rank_bm25 import BM25Okapi
+from contextlib import contextmanager
+from datetime import timedelta
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
 from core.utils.ColorScheme import ColorScheme
+from core.utils.bm25_index import BM25Index
+from core.utils.bm25_shards import ShardedBM25Index
+from core.utils.tokenizer import tokenize
 
 cs = ColorScheme()
-bm25_corpus = []
 bm25_index = None
+# Highest document id loaded into bm25_index; newer rows are appended
+# as a segment by update_bm25_index()
+last_indexed_id = 0
+# Database time of the last check; rows changed since (minus
+# UPDATE_SAFETY_WINDOW) are re-read
+last_checked_at = None
+# updated_at of the rows read inside the safety window, by id, so they are
+# not indexed again on every check
+_window_versions = {}
+# Rows read but not indexed (no tokens), so live_count + this should
+# equal the table's row count
+unindexed_count = 0
+
+# Drop per-language stopwords from indexed documents (smaller postings).
+BM25_REMOVE_STOPWORDS = True
+
+# Worker processes scoring BM25 in parallel, each over an id range of the
+# corpus (see ShardedBM25Index). 1 keeps the index in this process.
+BM25_SHARDS = 1
+
+# updated_at is stamped before the row commits, so a change can become
+# visible after a check that already saw later stamps. Each check re-reads
+# rows stamped this long before the previous one: writers must commit
+# within this window (update_document uses clock_timestamp() and commits
+# right away).
+UPDATE_SAFETY_WINDOW = timedelta(minutes=1)
+
+_SELECT_DOCUMENTS = """
+    SELECT id, content, languages, book_id, page_number, created_at
+    FROM document
+"""
+_SELECT_TABLE_STATE = "SELECT count(*), max(updated_at), now() FROM document"
+_SELECT_VERSIONS = "SELECT id, updated_at FROM document"
+
 
+@contextmanager
+def _read_transaction(cursor):
+    """
+    Roll back the transaction the reads inside open, unless the caller's
+    connection was already in one: an idle-in-transaction connection keeps
+    its locks and blocks schema changes in other processes.
+    """
+    conn = getattr(cursor, "connection", None)
+    owned = (
+        conn is not None
+        and not conn.autocommit
+        and conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+    )
+    try:
+        yield
+    finally:
+        if owned:
+            conn.rollback()
+
+
+def _tokenize_rows(rows, normalize_content, remove_stopwords=None):
+    """Rows from _SELECT_DOCUMENTS -> (doc_id, tokens, metadata) tuples."""
+    if remove_stopwords is None:
+        remove_stopwords = BM25_REMOVE_STOPWORDS
+    docs = []
+    for doc_id, content, language, book_id, page_number, created_at in rows:
+        content = normalize_content(content)
+        tokens = tokenize(content, language, remove_stopwords=remove_stopwords)
+
+        # Skip documents where tokenization resulted in an empty list
+        if tokens:
+            metadata = {
+                "content": content,
+                "language": language,
+                "book_id": book_id,
+                "page_number": page_number,
+                "created_at": created_at,
+            }
+            docs.append((doc_id, tokens, metadata))
+    return docs
 
-def update_bm25_index(cursor, normalize_content):
-    global bm25_index, bm25_corpus
 
-    cursor.execute("SELECT id, content FROM document")
+def rebuild_bm25_index(cursor, normalize_content, silent=False):
+    """Full reload of the BM25 index from the document table."""
+    global bm25_index, last_indexed_id, last_checked_at, unindexed_count
+    global _window_versions
+
+    cursor.execute(_SELECT_TABLE_STATE)
+    _, _, last_checked_at = cursor.fetchone()
+    # Versions before content: a row changed in between is re-read once
+    cursor.execute(
+        _SELECT_VERSIONS + " WHERE updated_at > %s",
+        (last_checked_at - UPDATE_SAFETY_WINDOW,),
+    )
+    _window_versions = dict(cursor.fetchall())
+    cursor.execute(_SELECT_DOCUMENTS)
     rows = cursor.fetchall()
+    last_indexed_id = max((row[0] for row in rows), default=0)
+
+    if BM25_SHARDS > 1 and rows:
+        if not isinstance(bm25_index, ShardedBM25Index):
+            close_bm25_index()
+            bm25_index = ShardedBM25Index(
+                normalize_content, BM25_SHARDS, BM25_REMOVE_STOPWORDS
+            )
+        indexed = bm25_index.load(rows)
+    else:
+        docs = _tokenize_rows(rows, normalize_content)
+        close_bm25_index()
+        bm25_index = BM25Index(docs) if docs else None
+        indexed = len(docs)
 
-    # 1. Create corpus of (doc_id, normalized_content)
-    bm25_corpus = [(row[0], normalize_content(row[1])) for row in rows]
+    unindexed_count = len(rows) - indexed
+    if not indexed:
+        close_bm25_index()
+        return
+    if not silent:
+        print(f"{cs.GREEN}✅ BM25 index updated with {indexed} documents{cs.RESET}")
+
+
+def close_bm25_index():
+    """Drop the index, stopping shard workers if it is sharded."""
+    global bm25_index
+
+    if isinstance(bm25_index, ShardedBM25Index):
+        bm25_index.close()
+    bm25_index = None
 
-    # 2. Tokenize the content for the index
-    tokenized_contents = [content.split() for _, content in bm25_corpus]
 
-    # 3. Filter out items where tokenization resulted in an empty list
-    valid_tokenized = [tokens for tokens in tokenized_contents if tokens]
-    # print(
-    #     f"{cs.CYAN}📊 DEBUG: After filtering, {len(valid_tokenized)} valid documents{cs.RESET}"
-    # )
+def update_bm25_index(cursor, normalize_content, silent=False):
+    """
+    Bring the BM25 index up to date with the document table.
+    Rows newer than `last_indexed_id`, or stamped since the previous check
+    (minus UPDATE_SAFETY_WINDOW) with an updated_at not indexed yet, are
+    read by any process and appended as a new segment, replacing their old
+    entries. If the index then still disagrees with the table's row count
+    (rows deleted elsewhere, or committed out of id order), it is rebuilt.
+    The first call (or an empty index) does a full rebuild.
+    """
+    with _read_transaction(cursor):
+        _update_bm25_index(cursor, normalize_content, silent)
 
-    # Filter out empty documents
 
-    if not valid_tokenized:
-        bm25_index = None
-        bm25_corpus = []  # Ensure corpus is also cleared if no valid documents
+def _update_bm25_index(cursor, normalize_content, silent):
+    global last_checked_at, _window_versions
+
+    if bm25_index is None:
+        rebuild_bm25_index(cursor, normalize_content, silent)
         return
 
-    # Re-align corpus to only contain documents that were actually indexed (optional but safer)
-    # The current approach is fine if you know all rows have content.
+    cursor.execute(_SELECT_TABLE_STATE)
+    row_count, updated_at, checked_at = cursor.fetchone()
+    since = last_checked_at - UPDATE_SAFETY_WINDOW
+    if updated_at is not None and updated_at > since:
+        cursor.execute(
+            _SELECT_VERSIONS + " WHERE id > %s OR updated_at > %s",
+            (last_indexed_id, since),
+        )
+        versions = dict(cursor.fetchall())
+        changed = [
+            doc_id
+            for doc_id, version in versions.items()
+            if _window_versions.get(doc_id) != version
+        ]
+        if changed:
+            cursor.execute(
+                _SELECT_DOCUMENTS + " WHERE id = ANY(%s) ORDER BY id", (changed,)
+            )
+            rows = cursor.fetchall()
+            if rows:
+                # Changed rows replace their indexed copy
+                bm25_index.delete([row[0] for row in rows if row[0] <= last_indexed_id])
+                _append_rows(rows, normalize_content, silent)
+        _window_versions = versions
+    else:
+        _window_versions = {}
+    last_checked_at = checked_at
 
-    bm25_index = BM25Okapi(valid_tokenized)
-    print(
-        f"{cs.GREEN}✅ BM25 index updated with {len(valid_tokenized)} documents{cs.RESET}"
-    )
+    if bm25_index.live_count + unindexed_count != row_count:
+        rebuild_bm25_index(cursor, normalize_content, silent)
+
+
+def _append_rows(rows, normalize_content, silent=False):
+    global last_indexed_id, unindexed_count
+
+    if isinstance(bm25_index, ShardedBM25Index):
+        added = bm25_index.add_rows(rows)  # tokenized by the shards
+    else:
+        added = bm25_index.add_documents(_tokenize_rows(rows, normalize_content))
+    unindexed_count += len(rows) - added
+    last_indexed_id = max(last_indexed_id, max(row[0] for row in rows))
+    if added and not silent:
+        print(f"{cs.GREEN}✅ BM25 index updated with {added} new documents{cs.RESET}")
+
+
+def remove_from_bm25_index(doc_ids):
+    """Tombstone documents so BM25 scoring skips them immediately."""
+    if bm25_index is None:
+        return 0
+    return bm25_index.delete(doc_ids)
+
+
+def reindex_documents(cursor, doc_ids, normalize_content):
+    """Replace the indexed copy of updated documents."""
+    with _read_transaction(cursor):
+        if bm25_index is None:
+            rebuild_bm25_index(cursor, normalize_content)
+            return
+
+        bm25_index.delete(doc_ids)
+        cursor.execute(_SELECT_DOCUMENTS + " WHERE id = ANY(%s)", (list(doc_ids),))
+        rows = cursor.fetchall()
+        if rows:
+            _append_rows(rows, normalize_content)
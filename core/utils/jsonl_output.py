@@ -0,0 +1,19 @@
+import json
+import sys
+from datetime import date, datetime
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_jsonl(response) -> str:
+    """Serialize a search() response as a single JSON line."""
+    return json.dumps(response, ensure_ascii=False, default=_default)
+
+
+def write_jsonl(response, stream=None):
+    stream = stream or sys.stdout
+    stream.write(to_jsonl(response) + "\n")
@@ -0,0 +1,105 @@
+import hashlib
+import zlib
+
+import numpy as np
+
+from core.utils.tokenizer import tokenize
+
+NUM_PERM = 64
+SHINGLE_SIZE = 3
+# LSH banding: BANDS * ROWS == NUM_PERM. Pairs above roughly
+# (1 / BANDS) ** (1 / ROWS) ~ 0.5 similarity share a bucket; candidates
+# are then checked against the full signature.
+BANDS = 16
+ROWS = 4
+DEDUP_THRESHOLD = 0.8
+
+_PRIME = (1 << 31) - 1
+
+
+def _coefficient(name, i):
+    # Derived from a fixed digest so signatures stay comparable across runs
+    # and numpy versions
+    digest = hashlib.blake2b(f"minhash-{name}-{i}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % (_PRIME - 1) + 1
+
+
+_A = np.array([_coefficient("a", i) for i in range(NUM_PERM)], dtype=np.uint64)
+_B = np.array([_coefficient("b", i) for i in range(NUM_PERM)], dtype=np.uint64)
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Set of word `size`-grams over normalized tokens (whole text if shorter)."""
+    tokens = tokenize(text)
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i : i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def signature(text):
+    """MinHash signature of `text` as NUM_PERM uint32 values."""
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode()) % _PRIME for shingle in shingles(text)),
+        dtype=np.uint64,
+    )
+    if not len(hashes):
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+    # a < 2**31 and hash < 2**31, so a * hash + b fits in uint64
+    return (
+        ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME)
+        .min(axis=1)
+        .astype(np.uint32)
+    )
+
+
+def to_bytes(sig):
+    """Compact storage form (4 bytes per permutation) for `document.minhash`."""
+    return np.asarray(sig, dtype="<u4").tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype="<u4")
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of the shingle sets."""
+    return float(np.count_nonzero(sig_a == sig_b)) / NUM_PERM
+
+
+class LSHIndex:
+    """
+    Banded LSH buckets over MinHash signatures for near-duplicate lookup
+    without comparing against every stored signature.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    @staticmethod
+    def _band_keys(sig):
+        data = to_bytes(sig)
+        width = ROWS * 4
+        return [
+            (band, data[band * width : (band + 1) * width]) for band in range(BANDS)
+        ]
+
+    def add(self, key, sig):
+        self.signatures[key] = sig
+        for band_key in self._band_keys(sig):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def find_duplicate(self, sig, threshold=DEDUP_THRESHOLD):
+        """Key of a stored signature at least `threshold` similar, or None."""
+        seen = set()
+        for band_key in self._band_keys(sig):
+            for key in self.buckets.get(band_key, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                if similarity(sig, self.signatures[key]) >= threshold:
+                    return key
+        return None
@@ -3,12 +3,17 @@ from rich.table import Table
 import arabic_reshaper
 from bidi.algorithm import get_display
 from datetime import datetime
-import re
 from rich.text import Text
 from utils.text_properties import clean_text
+from utils.tokenizer import iter_token_spans, tokenize
 
 console = Console()
 
+CONTENT_WIDTH = 100
+# Only this much of each row is cleaned/highlighted; the table shows
+# CONTENT_WIDTH characters, the rest is slack for text clean_text() removes.
+CONTENT_WINDOW = CONTENT_WIDTH * 4
+
 
 def fix_arabic_text(text):
     """
@@ -20,10 +25,16 @@ def fix_arabic_text(text):
     return get_display(reshaped_text)
 
 
-def highlight_query(content, query: str) -> Text:
+def query_terms(query: str) -> frozenset:
+    """Normalized query terms, computed once per query for highlight_query()."""
+    return frozenset(tokenize(query)) if query else frozenset()
+
+
+def highlight_query(content, query: str = "", terms=None) -> Text:
     """
     Highlights query terms in the given content.
     Accepts either a plain string or a rich.Text object.
+    Pass `terms` (see query_terms) to reuse one matcher across rows.
     """
     if isinstance(content, Text):
         txt = content
@@ -32,12 +43,16 @@ def highlight_query(content, query: str) -> Text:
         txt = Text(content)
         plain_text = content
 
-    if not query:
+    if terms is None:
+        terms = query_terms(query)
+    if not terms:
         return txt
 
-    for term in query.split():
-        for match in re.finditer(re.escape(term), plain_text, re.IGNORECASE):
-            txt.stylize("bold yellow", match.start(), match.end())
+    # One pass over the text: match normalized tokens against the term set,
+    # so highlighting agrees with BM25 matching
+    for token, start, end in iter_token_spans(plain_text):
+        if token in terms:
+            txt.stylize("bold yellow", start, end)
 
     return txt
 
@@ -82,23 +97,32 @@ def truncate_at_word(text: str, max_length: int) -> str:
     return truncated_text
 
 
-def display_results(results, query=""):
+def display_results(results, query="", max_rows=None):
     """
-    Prints the search results in a well-formatted rich table.
+    Prints the search results (dicts returned by search()) in a
+    well-formatted rich table. Cleaning, highlighting and Arabic shaping
+    run only for the rows shown (the first `max_rows`, default all).
     """
     table = Table(title="Search Results", show_header=True, header_style="bold magenta")
     table.add_column("Doc ID", style="cyan", width=8)
     table.add_column("Score", style="magenta", width=10)
-    table.add_column("Content", style="white", width=100, overflow="fold")
+    table.add_column("Content", style="white", width=CONTENT_WIDTH, overflow="fold")
     table.add_column("Language", style="green", width=12)
     table.add_column("Created At", style="blue", width=12)
 
     lang_map = {"en": "English", "fa": "Persian", "id": "Indonesian", None: "Unknown"}
 
-    for doc_id, content, score, language, created_at in results:
-        content_display = clean_text(content)
-        content_display = highlight_query(content_display, query)
-        content_display.truncate(100, overflow="ellipsis")
+    terms = query_terms(query)
+    rows = results if max_rows is None else results[:max_rows]
+
+    for result in rows:
+        language = result["language"]
+        score = result["score"]
+        created_at = result["created_at"]
+
+        content_display = clean_text(result["content"][:CONTENT_WINDOW])
+        content_display = highlight_query(content_display, terms=terms)
+        content_display.truncate(CONTENT_WIDTH, overflow="ellipsis")
 
         # Step 3: Handle Arabic/Persian shaping after truncation
         if language == "fa":
@@ -117,7 +141,7 @@ def display_results(results, query=""):
 
         # Add row
         table.add_row(
-            str(doc_id),
+            str(result["id"]),
             f"[{score_style}]{score:.3f}[/{score_style}]",
             content_display,  # Pass Text directly
             language_display,
@@ -17,45 +17,44 @@ def normalize_content(text: str) -> str:
     return " ".join(text.strip().split()).lower()
 
 
-def clean_text(text: str) -> str:
-    """
-    Clean for display (presentation layer only).
-    Removes formatting noise, artifacts, etc.
-    """
-    if not text:
-        return ""
-
+# (pattern, replacement) pairs for clean_text(), compiled once at import
+_CLEAN_PATTERNS = [
     # Remove Rich formatting tags like [bold], [yellow], etc.
-    text = re.sub(r"\[/?[a-z]+\]", "", text, flags=re.IGNORECASE)
-
+    (re.compile(r"\[/?[a-z]+\]", re.IGNORECASE), ""),
     # Fix common OCR issues and line breaks
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
-    text = re.sub(r"\n+", " ", text)
-
+    (re.compile(r"(\w)-\n(\w)"), r"\1\2"),
+    (re.compile(r"\n+"), " "),
     # Remove URLs, mentions, hashtags
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"@\w+", "", text)
-    text = re.sub(r"#\w+", "", text)
-
+    (re.compile(r"http\S+"), ""),
+    (re.compile(r"@\w+"), ""),
+    (re.compile(r"#\w+"), ""),
     # Remove runs of symbols like ######, $$$$$, ,,,, etc.
-    text = re.sub(r"[^\w\s\.\,\!\?\-]{2,}", " ", text)
-
+    (re.compile(r"[^\w\s\.\,\!\?\-]{2,}"), " "),
     # Remove isolated special characters
-    text = re.sub(r"\s[^\w\s\.\,\!\?\-]\s", " ", text)
-
+    (re.compile(r"\s[^\w\s\.\,\!\?\-]\s"), " "),
     # remove period
-    text = re.sub(r"\.", "", text)
+    (re.compile(r"\."), ""),
     # remove dollar sign
-    text = re.sub(r"[#$]", "", text)
-
+    (re.compile(r"[#$]"), ""),
     # Keep single allowed punctuation but collapse duplicates (e.g., "....." → ".")
-    text = re.sub(r"([.,!?-])\1{1,}", r"\1", text)
-
+    (re.compile(r"([.,!?-])\1{1,}"), r"\1"),
     # Remove page numbers and headers
-    text = re.sub(r"\bPage\s+\d+\b", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\b\d{1,3}\s+of\s+\d{1,3}\b", "", text)
-
+    (re.compile(r"\bPage\s+\d+\b", re.IGNORECASE), ""),
+    (re.compile(r"\b\d{1,3}\s+of\s+\d{1,3}\b"), ""),
     # Collapse multiple spaces
-    text = re.sub(r"\s+", " ", text).strip()
+    (re.compile(r"\s+"), " "),
+]
+
+
+def clean_text(text: str) -> str:
+    """
+    Clean for display (presentation layer only).
+    Removes formatting noise, artifacts, etc.
+    """
+    if not text:
+        return ""
+
+    for pattern, replacement in _CLEAN_PATTERNS:
+        text = pattern.sub(replacement, text)
 
     return text.strip()
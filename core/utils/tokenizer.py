@@ -0,0 +1,126 @@
+import re
+
+# Arabic-script marks that carry no lexical meaning for retrieval:
+# harakat/tanween, superscript alef, Quranic annotation marks, tatweel,
+# and the zero-width (non-)joiners Persian uses inside compound words.
+_IGNORABLE_CHARS = (
+    "\u0610-\u061a"
+    "\u064b-\u065f"
+    "\u0670"
+    "\u06d6-\u06ed"
+    "\u0640"
+    "\u200c\u200d"
+)
+
+_ARABIC_SCRIPT_RE = re.compile("[\u0600-\u06ff\u200c\u200d]")
+_IGNORABLE_RE = re.compile(f"[{_IGNORABLE_CHARS}]+")
+_WORD_RE = re.compile(r"\w+")
+# Same as _WORD_RE but keeps ignorable marks inside the match so that
+# spans line up with the original (un-normalized) text.
+_SPAN_RE = re.compile(f"(?:\\w|[{_IGNORABLE_CHARS}])+")
+
+# Fold Arabic and Persian letter variants to a single form so that text
+# typed on either keyboard layout produces the same token.
+_ARABIC_SCRIPT_FOLD = str.maketrans(
+    {
+        "ي": "ی",
+        "ى": "ی",
+        "ئ": "ی",
+        "ك": "ک",
+        "ة": "ه",
+        "ۀ": "ه",
+        "أ": "ا",
+        "إ": "ا",
+        "آ": "ا",
+        "ٱ": "ا",
+        "ؤ": "و",
+        # Persian and Arabic-Indic digits
+        "۰": "0",
+        "۱": "1",
+        "۲": "2",
+        "۳": "3",
+        "۴": "4",
+        "۵": "5",
+        "۶": "6",
+        "۷": "7",
+        "۸": "8",
+        "۹": "9",
+        "٠": "0",
+        "١": "1",
+        "٢": "2",
+        "٣": "3",
+        "٤": "4",
+        "٥": "5",
+        "٦": "6",
+        "٧": "7",
+        "٨": "8",
+        "٩": "9",
+    }
+)
+
+
+def _fold(words):
+    return frozenset(normalize_token(w) for w in words.split())
+
+
+def normalize_token(text: str) -> str:
+    """
+    Normalize text for matching (lowercase, Arabic-script folding).
+    - Strips diacritics, tatweel and ZWNJ
+    - Maps ي/ى -> ی, ك -> ک, أ/إ/آ -> ا, Persian/Arabic digits -> 0-9
+    """
+    text = text.lower()
+    if _ARABIC_SCRIPT_RE.search(text):
+        text = _IGNORABLE_RE.sub("", text).translate(_ARABIC_SCRIPT_FOLD)
+    return text
+
+
+STOPWORDS = {
+    "en": _fold(
+        "a an and are as at be but by for from has have he in is it its of on "
+        "or that the their there these they this to was were will with"
+    ),
+    "fa": _fold(
+        "و در به از که این آن با را برای است هم یا تا بر می شود شد "
+        "کرد کند بود ها های یک نیز اما پس"
+    ),
+    "ar": _fold(
+        "و في من إلى على عن أن إن هذا هذه ذلك التي الذي ما لا مع كان "
+        "كانت هو هي قد ثم أو"
+    ),
+    "id": _fold(
+        "dan di ke dari yang untuk dengan pada adalah ini itu dalam "
+        "tidak akan atau juga oleh sebagai"
+    ),
+}
+
+
+def tokenize(text: str, language=None, remove_stopwords=False) -> list:
+    """
+    Split text into normalized word tokens (punctuation is dropped).
+    - `language`: ISO code used to pick the stopword list
+    - `remove_stopwords`: drop stopwords for `language` when known
+    """
+    if not text:
+        return []
+
+    tokens = _WORD_RE.findall(normalize_token(text))
+
+    if remove_stopwords:
+        stopwords = STOPWORDS.get(language)
+        if stopwords:
+            tokens = [t for t in tokens if t not in stopwords]
+
+    return tokens
+
+
+def iter_token_spans(text: str):
+    """
+    Yield (token, start, end) for each word in `text`.
+    Offsets refer to the original string, tokens are normalized exactly
+    like `tokenize()` so they can be compared against query tokens.
+    """
+    for match in _SPAN_RE.finditer(text):
+        token = normalize_token(match.group())
+        if token:
+            yield token, match.start(), match.end()
@@ -0,0 +1,41 @@
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Modules import both `core.utils...` and `utils...` (run from core/)
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "core"))
+sys.path.insert(0, ROOT)
+
+EMBEDDING_DIMS = 16
+
+
+class HashEmbedder:
+    """Deterministic bag-of-words embedder standing in for the model."""
+
+    def _encode_one(self, text):
+        vector = np.zeros(EMBEDDING_DIMS)
+        for word in text.split():
+            digest = hashlib.blake2b(word.encode(), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % EMBEDDING_DIMS] += 1
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        return np.array([self._encode_one(text) for text in texts])
+
+
+@pytest.fixture(scope="session")
+def ops():
+    """db.database_operations without a database or model download."""
+    import db.database_operations as ops
+
+    # Both are set up on first use; tests never reach a configured database
+    ops.db_connection = lambda: None
+    ops.model = HashEmbedder()
+    return ops
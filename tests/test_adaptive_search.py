@@ -0,0 +1,128 @@
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import utils.bm25_utils as bm25_utils
+
+VOCAB = [f"word{i}" for i in range(200)]
+WEIGHTS = [1 / (i + 1) ** 0.8 for i in range(200)]
+UPDATED_AT = datetime(2025, 1, 1)
+
+
+class CorpusCursor:
+    """
+    The document tables in memory: answers the BM25 index queries and the
+    exact (no coarse stage) semantic query of database_operations.
+    """
+
+    def __init__(self, rows, model):
+        self.rows = rows  # id -> (content, book_id)
+        ids = sorted(rows)
+        self.ids = np.array(ids)
+        self.embeddings = model.encode([rows[i][0] for i in ids])
+        self.semantic_queries = 0
+        self.result = []
+
+    def _document(self, doc_id):
+        content, book_id = self.rows[doc_id]
+        return (doc_id, content, "en", book_id, 1, UPDATED_AT)
+
+    def execute(self, sql, params=None):
+        if sql == bm25_utils._SELECT_TABLE_STATE:
+            self.result = [(len(self.rows), UPDATED_AT, UPDATED_AT)]
+        elif sql.startswith(bm25_utils._SELECT_VERSIONS):
+            self.result = [(i, UPDATED_AT) for i in sorted(self.rows)]
+        elif sql.startswith(bm25_utils._SELECT_DOCUMENTS):
+            last_id = params[0] if params else 0
+            self.result = [self._document(i) for i in sorted(self.rows) if i > last_id]
+        elif "FROM document_embedding" in sql or "JOIN document_embedding" in sql:
+            self.semantic_queries += 1
+            self.result = self._semantic(sql, params)
+        else:
+            raise AssertionError(f"unexpected query: {sql}")
+
+    def _semantic(self, sql, params):
+        vec, _, threshold, *filter_params, _, limit = params
+        query = np.array(vec.strip("[]").split(","), dtype=float)
+        # Odd power: same order, but the best matches stand out as they do
+        # with real embeddings (flat scores rarely certify a small pool)
+        similarities = (self.embeddings @ query) ** 5
+        rows = []
+        for pos in np.argsort(-similarities, kind="stable"):
+            doc_id = int(self.ids[pos])
+            content, book_id = self.rows[doc_id]
+            if similarities[pos] < threshold:
+                break
+            if "d.book_id = ANY(%s)" in sql and book_id not in filter_params[0]:
+                continue
+            rows.append(
+                (doc_id, content, float(similarities[pos]), "en", UPDATED_AT)
+                + (book_id, 1, None)
+            )
+            if len(rows) == limit:
+                break
+        return rows
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+
+@pytest.fixture
+def corpus(ops, monkeypatch):
+    rng = random.Random(21)
+    rows = {}
+    for doc_id in range(1, 1501):
+        words = rng.choices(VOCAB, WEIGHTS, k=rng.randint(6, 30))
+        rows[doc_id] = (" ".join(words), rng.choice(["a.pdf", "b.pdf"]))
+    for doc_id in range(1501, 1521):  # near-duplicates for dedup
+        rows[doc_id] = rows[doc_id - 1500]
+
+    cursor = CorpusCursor(rows, ops.model)
+    monkeypatch.setattr(ops, "cursor", cursor)
+    monkeypatch.setattr(ops, "current_projection", lambda cursor, lock=False: None)
+    bm25_utils.close_bm25_index()
+    yield cursor
+    bm25_utils.close_bm25_index()
+
+
+def ranking(response):
+    assert not response.get("error"), response.get("error")
+    return [(r["id"], round(r["score"], 9)) for r in response["results"]]
+
+
+def test_exact_budgeted_results_equal_unbudgeted(ops, corpus):
+    rng = random.Random(22)
+    exact = early = 0
+    for _ in range(80):
+        query = " ".join(rng.choices(VOCAB, WEIGHTS, k=rng.randint(1, 4)))
+        kwargs = {
+            "top_k": rng.choice([5, 10, 20]),
+            "threshold": rng.choice([-1, 0.0, 0.2]),
+            "bm25_weight": rng.choice([0.3, 0.5, 0.8]),
+            "filters": rng.choice([None, {"source": "a.pdf"}]),
+            "dedup": rng.choice([True, False]),
+        }
+        full = ops.search(query, **kwargs)
+        assert full["exact"] is True
+
+        before = corpus.semantic_queries
+        budgeted = ops.search(query, budget=60, **kwargs)
+        if budgeted["exact"]:
+            exact += 1
+            assert ranking(budgeted) == ranking(full), (query, kwargs)
+        early += corpus.semantic_queries - before == 1
+
+    assert exact == 80
+    assert early > 0  # some pools were certified before full depth
+
+
+def test_missed_budget_is_reported(ops, corpus):
+    response = ops.search("word1 word2 word3", top_k=20, budget=0)
+
+    assert response["exact"] is False
+    assert response["results"]
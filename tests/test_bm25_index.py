@@ -0,0 +1,215 @@
+import random
+from datetime import date, datetime
+
+import pytest
+from rank_bm25 import BM25Okapi
+
+from core.utils.bm25_index import BM25Index, normalize_filters
+
+VOCAB = [f"w{i}" for i in range(300)]
+WEIGHTS = [1 / (i + 1) ** 0.8 for i in range(300)]
+
+
+def make_docs(start, count, rng):
+    return [
+        (
+            doc_id,
+            rng.choices(VOCAB, WEIGHTS, k=rng.randint(5, 30)),
+            {"book_id": rng.choice(["a.pdf", "b.pdf"]), "page_number": doc_id % 7},
+        )
+        for doc_id in range(start, start + count)
+    ]
+
+
+def queries(rng, count=40):
+    return [rng.choices(VOCAB, WEIGHTS, k=rng.randint(1, 4)) for _ in range(count)]
+
+
+def okapi_scores(docs, query, live_ids=None):
+    """Reference scores over `docs`, keeping only `live_ids` (default all)."""
+    okapi = BM25Okapi([tokens for _, tokens, _ in docs])
+    live_ids = {doc_id for doc_id, _, _ in docs} if live_ids is None else live_ids
+    return {
+        doc_id: score
+        for (doc_id, tokens, _), score in zip(docs, okapi.get_scores(query))
+        if doc_id in live_ids and set(tokens) & set(query)
+    }
+
+
+def assert_scores_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for doc_id, score in expected.items():
+        assert actual[doc_id] == pytest.approx(score, abs=1e-9)
+
+
+def test_segments_match_single_build():
+    rng = random.Random(1)
+    docs = make_docs(1, 600, rng)
+    index = BM25Index(max_segments=100)
+    for start in range(0, len(docs), 100):
+        index.add_documents(docs[start : start + 100])
+
+    assert len(index.segments) == 6
+    for query in queries(rng):
+        assert_scores_equal(index.get_scores(query), okapi_scores(docs, query))
+
+
+def test_tombstones_skip_documents_until_compaction():
+    rng = random.Random(2)
+    docs = make_docs(1, 500, rng)
+    index = BM25Index(docs[:250], max_segments=100, compact_ratio=1)
+    index.add_documents(docs[250:])
+    deleted = set(rng.sample(range(1, 501), 80))
+
+    assert index.delete(deleted) == 80
+    assert index.delete(deleted) == 0
+    assert index.live_count == 420
+    live = {doc_id for doc_id, _, _ in docs} - deleted
+    # Statistics still include the tombstoned documents
+    for query in queries(rng):
+        assert_scores_equal(index.get_scores(query), okapi_scores(docs, query, live))
+    assert index.document(next(iter(deleted))) is None
+
+
+def test_compaction_refreshes_statistics():
+    rng = random.Random(3)
+    docs = make_docs(1, 500, rng)
+    index = BM25Index(docs[:200], compact_ratio=0.2)
+    index.add_documents(docs[200:])
+    deleted = set(rng.sample(range(1, 501), 120))
+
+    index.delete(deleted)  # over 20% deleted: compacts
+    assert len(index.segments) == 1
+    assert index.corpus_size == index.live_count == 380
+    live_docs = [doc for doc in docs if doc[0] not in deleted]
+    for query in queries(rng):
+        assert_scores_equal(index.get_scores(query), okapi_scores(live_docs, query))
+
+
+def test_segment_count_triggers_merge():
+    rng = random.Random(4)
+    index = BM25Index(max_segments=3)
+    docs = []
+    for start in range(1, 201, 50):
+        batch = make_docs(start, 50, rng)
+        docs.extend(batch)
+        index.add_documents(batch)
+
+    assert len(index.segments) == 1
+    for query in queries(rng):
+        assert_scores_equal(index.get_scores(query), okapi_scores(docs, query))
+
+
+def test_updated_document_is_live_only_in_newest_segment():
+    rng = random.Random(5)
+    docs = make_docs(1, 100, rng)
+    index = BM25Index(docs, max_segments=100, compact_ratio=1)
+    index.delete([7])
+    index.add_documents([(7, ["fresh", "text"], {"book_id": "c.pdf"})])
+
+    assert index.document(7)["book_id"] == "c.pdf"
+    assert 7 in index.get_scores(["fresh"])
+    assert index.live_count == 100
+
+
+def test_filters_apply_across_segments():
+    rng = random.Random(6)
+    docs = make_docs(1, 300, rng)
+    index = BM25Index(docs[:150], max_segments=100, compact_ratio=1)
+    index.add_documents(docs[150:])
+    index.delete(range(1, 300, 9))
+    live = {doc_id for doc_id, _, meta in docs if meta["book_id"] == "a.pdf"}
+    live -= set(range(1, 300, 9))
+
+    for query in queries(rng):
+        assert_scores_equal(
+            index.get_scores(query, filters={"source": "a.pdf"}),
+            okapi_scores(docs, query, live),
+        )
+
+
+def assert_pruned_matches(index, query, k, filters=None, include_ids=()):
+    full, _ = index.top_scores(query, k, filters, include_ids)
+    pruned, scored, complete = index.pruned_top_scores(query, k, filters, include_ids)
+    assert complete
+    # Ties at the k-th score may be broken either way
+    ranked = sorted(
+        (s for s in index.get_scores(query, filters).values() if s > 0),
+        reverse=True,
+    )
+    kth = (ranked[k - 1] if len(ranked) >= k else 0) + 1e-9
+    above = {d for d, s in full.items() if s > kth}
+    assert {d for d, s in pruned.items() if s > kth} == above
+    assert len(pruned) == len(full)
+    for doc_id, score in pruned.items():
+        assert score == pytest.approx(full[doc_id], abs=1e-9)
+    for doc_id in include_ids:
+        assert (doc_id in pruned) == (doc_id in full)
+    assert scored <= len(index.get_scores(query, filters))
+
+
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_pruned_top_scores_match_full_scoring(k):
+    rng = random.Random(7)
+    docs = make_docs(1, 800, rng)
+    index = BM25Index(docs[:400], max_segments=100, compact_ratio=1)
+    index.add_documents(docs[400:])
+    for query in queries(rng, 60):
+        include = rng.sample(range(1, 801), 10)
+        assert_pruned_matches(index, query, k, include_ids=include)
+
+
+def test_pruned_top_scores_with_filters_and_tombstones():
+    rng = random.Random(8)
+    docs = make_docs(1, 800, rng)
+    index = BM25Index(docs[:400], max_segments=100, compact_ratio=1)
+    index.add_documents(docs[400:])
+    deleted = rng.sample(range(1, 801), 150)
+    index.delete(deleted)
+    filters = [None, {"source": "a.pdf"}, {"page_from": 2, "page_to": 4}]
+    for query in queries(rng, 60):
+        include = rng.sample(range(1, 801), 10)  # some of them tombstoned
+        assert_pruned_matches(index, query, 10, rng.choice(filters), include)
+
+
+def test_pruned_top_scores_skips_documents():
+    rng = random.Random(9)
+    index = BM25Index(make_docs(1, 2000, rng))
+    scored = matched = 0
+    for query in queries(rng, 60):
+        # Common terms plus a rare one: the rare term decides the top k
+        query = query + ["w299"]
+        scored += index.pruned_top_scores(query, 5)[1]
+        matched += len(index.get_scores(query))
+    assert scored < matched
+
+
+def test_pruned_top_scores_reports_a_missed_deadline():
+    rng = random.Random(10)
+    index = BM25Index(make_docs(1, 500, rng))
+    query = ["w0", "w1", "w2", "w3"]
+
+    top, _, complete = index.pruned_top_scores(query, 5, deadline=0)
+
+    assert not complete
+    assert top
+
+
+def test_date_only_created_before_covers_the_whole_day():
+    docs = [
+        (1, ["w1"], {"created_at": datetime(2025, 1, 30, 12)}),
+        (2, ["w1"], {"created_at": datetime(2025, 1, 31)}),
+        (3, ["w1"], {"created_at": datetime(2025, 1, 31, 23, 59, 59)}),
+        (4, ["w1"], {"created_at": datetime(2025, 2, 1)}),
+    ]
+    index = BM25Index(docs)
+
+    for before in ("2025-01-31", date(2025, 1, 31)):
+        filters = {"created_after": "2025-01-31", "created_before": before}
+        assert set(index.get_scores(["w1"], filters=filters)) == {2, 3}
+    # A time of day is taken as given
+    filters = {"created_before": "2025-01-31T12:00:00"}
+    assert set(index.get_scores(["w1"], filters=filters)) == {1, 2}
+    assert normalize_filters({"created_before": "2025-01-31"}) == {
+        "created_before": datetime(2025, 1, 31, 23, 59, 59, 999999)
+    }
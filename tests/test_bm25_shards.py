@@ -0,0 +1,108 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from core.utils.bm25_index import BM25Index
+from core.utils.bm25_shards import ShardedBM25Index
+from core.utils.bm25_utils import _tokenize_rows
+from core.utils.text_properties import normalize_content
+
+VOCAB = [f"term{i}" for i in range(400)]
+WEIGHTS = [1 / (i + 1) ** 0.8 for i in range(400)]
+
+
+def make_rows(start, count, rng):
+    return [
+        (
+            doc_id,
+            " ".join(rng.choices(VOCAB, WEIGHTS, k=rng.randint(5, 30))),
+            "en",
+            rng.choice(["a.pdf", "b.pdf"]),
+            doc_id % 9,
+            datetime(2025, 1, 1),
+        )
+        for doc_id in range(start, start + count)
+    ]
+
+
+class Pair:
+    """The same operations applied to a single and a sharded index."""
+
+    def __init__(self, rows):
+        self.single = BM25Index(_tokenize_rows(rows, normalize_content))
+        self.sharded = ShardedBM25Index(normalize_content, num_shards=3)
+        self.sharded.load(rows)
+
+    def add_rows(self, rows):
+        self.single.add_documents(_tokenize_rows(rows, normalize_content))
+        self.sharded.add_rows(rows)
+
+    def delete(self, doc_ids):
+        assert self.single.delete(doc_ids) == self.sharded.delete(doc_ids)
+
+    def assert_same(self, rng, filters=None):
+        assert self.sharded.corpus_size == self.single.corpus_size
+        assert self.sharded.live_count == self.single.live_count
+        for _ in range(30):
+            query = rng.choices(VOCAB, WEIGHTS, k=rng.randint(1, 4))
+            include = rng.sample(range(1, 3000), 20)
+            single, single_count = self.single.top_scores(query, 10, filters, include)
+            sharded, sharded_count = self.sharded.top_scores(
+                query, 10, filters, include
+            )
+            assert sharded_count == single_count
+            assert sharded.keys() == single.keys()
+            for doc_id, score in single.items():
+                assert sharded[doc_id] == pytest.approx(score, abs=1e-9)
+
+
+@pytest.fixture
+def pair():
+    rng = random.Random(11)
+    pair = Pair(make_rows(1, 3000, rng))
+    yield pair
+    pair.sharded.close()
+
+
+def test_scores_match_after_load(pair):
+    pair.assert_same(random.Random(1))
+    pair.assert_same(random.Random(2), filters={"source": "b.pdf", "page_to": 4})
+
+
+def test_scores_match_after_deletes_before_and_after_compaction(pair):
+    rng = random.Random(3)
+    # Concentrated in the first shard: over COMPACT_DELETED_RATIO there,
+    # below it overall
+    pair.delete(rng.sample(range(1, 1001), 399))
+    assert pair.single.deleted_count == pair.sharded.deleted_count == 399
+    pair.assert_same(rng)
+
+    pair.delete(rng.sample(range(1001, 3001), 300))  # crosses it: both compact
+    assert pair.single.deleted_count == pair.sharded.deleted_count == 0
+    pair.assert_same(rng)
+
+
+def test_scores_match_across_appends_and_segment_merges(pair):
+    rng = random.Random(4)
+    for start in range(3001, 3001 + 12 * 40, 40):
+        pair.add_rows(make_rows(start, 40, rng))
+        pair.delete(rng.sample(range(1, start), 15))
+        pair.assert_same(rng)
+
+
+def test_pruned_scores_match_single_index(pair):
+    rng = random.Random(5)
+    pair.delete(rng.sample(range(1, 3001), 200))
+    for filters in (None, {"source": "a.pdf"}):
+        for _ in range(20):
+            query = rng.choices(VOCAB, WEIGHTS, k=rng.randint(1, 4))
+            include = rng.sample(range(1, 3001), 10)
+            expected, _ = pair.single.top_scores(query, 10, filters, include)
+            top, _, complete = pair.sharded.pruned_top_scores(
+                query, 10, filters, include
+            )
+            assert complete
+            assert top.keys() == expected.keys()
+            for doc_id, score in expected.items():
+                assert top[doc_id] == pytest.approx(score, abs=1e-9)
@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+
+import psycopg2.extensions
+import pytest
+
+import utils.bm25_utils as bm25_utils
+
+
+def normalize(text):
+    return text.lower()
+
+
+class FakeTable:
+    """In-memory `document` table answering the queries bm25_utils sends."""
+
+    def __init__(self):
+        self.rows = {}
+        self.clock = datetime(2025, 1, 1)
+        self.next_id = 1
+
+    def tick(self):
+        self.clock += timedelta(seconds=1)
+        return self.clock
+
+    def insert(self, content, doc_id=None):
+        doc_id = doc_id or self.next_id
+        self.next_id = max(self.next_id, doc_id + 1)
+        self.rows[doc_id] = {"content": content, "updated_at": self.tick()}
+        return doc_id
+
+    def update(self, doc_id, content):
+        self.rows[doc_id] = {"content": content, "updated_at": self.tick()}
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.result = []
+        self.document_queries = 0
+
+    def _row(self, doc_id):
+        row = self.table.rows[doc_id]
+        return (doc_id, row["content"], "en", "a.pdf", 1, datetime(2025, 1, 1))
+
+    def execute(self, sql, params=None):
+        rows = self.table.rows
+        if sql == bm25_utils._SELECT_TABLE_STATE:
+            stamps = [row["updated_at"] for row in rows.values()]
+            self.result = [(len(rows), max(stamps, default=None), self.table.clock)]
+            return
+        if sql.startswith(bm25_utils._SELECT_VERSIONS):
+            where = sql[len(bm25_utils._SELECT_VERSIONS) :]
+            if "id > %s OR updated_at > %s" in where:
+                last_id, since = params
+            else:
+                assert where == " WHERE updated_at > %s", where
+                last_id, since = max(rows, default=0), params[0]
+            self.result = [
+                (doc_id, row["updated_at"])
+                for doc_id, row in sorted(rows.items())
+                if doc_id > last_id or row["updated_at"] > since
+            ]
+            return
+        assert sql.startswith(bm25_utils._SELECT_DOCUMENTS), sql
+        where = sql[len(bm25_utils._SELECT_DOCUMENTS) :]
+        self.document_queries += 1
+        if "id = ANY(%s)" in where:
+            ids = [doc_id for doc_id in params[0] if doc_id in rows]
+        else:
+            assert not where.strip(), where
+            ids = list(rows)
+        self.result = [self._row(doc_id) for doc_id in sorted(ids)]
+
+    def fetchall(self):
+        return self.result
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+
+@pytest.fixture
+def table():
+    bm25_utils.close_bm25_index()
+    table = FakeTable()
+    for i in range(20):
+        table.insert(f"document number {i} about topic{i % 3}")
+    yield table
+    bm25_utils.close_bm25_index()
+
+
+def indexed_content(doc_id):
+    doc = bm25_utils.bm25_index.document(doc_id)
+    return doc and doc["content"]
+
+
+def test_new_rows_are_appended_without_rebuild(table, monkeypatch):
+    cursor = table.cursor()
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+    index = bm25_utils.bm25_index
+    monkeypatch.setattr(
+        bm25_utils, "rebuild_bm25_index", lambda *args, **kwargs: pytest.fail()
+    )
+
+    doc_id = table.insert("a brand new document")
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    assert bm25_utils.bm25_index is index
+    assert len(index.segments) == 2
+    assert indexed_content(doc_id) == "a brand new document"
+
+    # Rows re-read inside the safety window are only indexed once
+    queries = cursor.document_queries
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+    assert cursor.document_queries == queries
+    assert len(index.segments) == 2
+
+
+def test_rows_updated_elsewhere_are_reindexed(table):
+    cursor = table.cursor()
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    table.update(5, "rewritten by another process")
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    assert indexed_content(5) == "rewritten by another process"
+    assert bm25_utils.bm25_index.live_count == 20
+    assert 5 in bm25_utils.bm25_index.get_scores(["rewritten"])
+
+
+def test_update_stamped_before_the_last_check_is_picked_up(table):
+    cursor = table.cursor()
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    # Process A stamps its update, then process B's later update commits
+    # and is indexed here before A commits
+    stamp = table.tick()
+    table.update(7, "committed first")
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+    table.rows[5] = {"content": "committed last", "updated_at": stamp}
+    assert stamp < max(row["updated_at"] for row in table.rows.values())
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    assert indexed_content(5) == "committed last"
+    assert indexed_content(7) == "committed first"
+    assert bm25_utils.bm25_index.live_count == 20
+
+
+def test_rows_deleted_elsewhere_trigger_rebuild(table):
+    cursor = table.cursor()
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    del table.rows[3]
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    assert indexed_content(3) is None
+    assert bm25_utils.bm25_index.live_count == 19
+
+
+def test_rows_committed_out_of_id_order_are_picked_up(table):
+    cursor = table.cursor()
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+    # A long transaction took id 21 before a short one committed id 22,
+    # with an older updated_at than the watermark
+    table.insert("short transaction", doc_id=22)
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+    table.rows[21] = {"content": "long transaction", "updated_at": datetime(2024, 1, 1)}
+
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+
+    assert indexed_content(21) == "long transaction"
+    assert bm25_utils.bm25_index.live_count == 22
+
+
+class FakeConnection:
+    def __init__(self, status):
+        self.autocommit = False
+        self.status = status
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+@pytest.mark.parametrize(
+    "status, rollbacks",
+    [
+        (psycopg2.extensions.TRANSACTION_STATUS_IDLE, 1),
+        (psycopg2.extensions.TRANSACTION_STATUS_INTRANS, 0),
+    ],
+)
+def test_reads_end_their_own_transaction_only(table, status, rollbacks):
+    cursor = table.cursor()
+    cursor.connection = FakeConnection(status)
+
+    bm25_utils.update_bm25_index(cursor, normalize, silent=True)
+    bm25_utils.reindex_documents(cursor, [5], normalize)
+
+    # A caller's open transaction (e.g. queued inserts) is left alone
+    assert cursor.connection.rollbacks == 2 * rollbacks
@@ -0,0 +1,145 @@
+import re
+
+import pytest
+
+from core.ingestion.chunker import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    FOOTER_PATTERNS,
+    HEADER_PATTERNS,
+    clean_element,
+    compile_line_patterns,
+    iter_chunks,
+)
+
+SENTENCES = [
+    f"Sentence number {i} talks about retrieval and ranking models. "
+    for i in range(200)
+]
+
+
+def element(text, page=1, book="book.pdf"):
+    return {"raw_text": text, "page_number": page, "book_id": book}
+
+
+def chunks_of(elements, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, **kwargs):
+    return list(iter_chunks(elements, chunk_size, chunk_overlap, **kwargs))
+
+
+def words(text):
+    return text.split()
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", [(500, 50), (120, 30), (60, 0)])
+def test_chunks_respect_chunk_size(chunk_size, chunk_overlap):
+    elements = [element("".join(SENTENCES[i : i + 7])) for i in range(0, 200, 7)]
+
+    chunks = chunks_of(elements, chunk_size, chunk_overlap)
+
+    assert len(chunks) > 1
+    assert all(0 < len(c["content"]) <= chunk_size for c in chunks)
+
+
+def test_chunks_prefer_sentence_boundaries():
+    chunks = chunks_of([element("".join(SENTENCES[:40]))], 200, 0)
+
+    assert all(c["content"].endswith(".") for c in chunks[:-1])
+
+
+def shared_words(previous, chunk):
+    """Longest run of words ending `previous` that starts `chunk`."""
+    previous, chunk = words(previous), words(chunk)
+    for n in range(min(len(previous), len(chunk)), 0, -1):
+        if previous[-n:] == chunk[:n]:
+            return previous[-n:]
+    return []
+
+
+def test_consecutive_chunks_overlap():
+    text = " ".join(f"w{i}" for i in range(400))
+    chunks = [c["content"] for c in chunks_of([element(text)], 100, 30)]
+
+    assert len(chunks) > 2
+    for previous, chunk in zip(chunks, chunks[1:]):
+        overlap = " ".join(shared_words(previous, chunk))
+        assert overlap and len(overlap) <= 30
+    # Nothing is lost between chunks
+    covered = {w for chunk in chunks for w in words(chunk)}
+    assert covered == set(words(text))
+
+
+def test_no_overlap_means_disjoint_chunks():
+    text = " ".join(f"w{i}" for i in range(400))
+    chunks = [c["content"] for c in chunks_of([element(text)], 100, 0)]
+
+    assert [w for chunk in chunks for w in words(chunk)] == words(text)
+
+
+def test_text_without_separators_is_hard_cut():
+    text = "".join(chr(ord("a") + i % 26) for i in range(1234))
+    chunks = [c["content"] for c in chunks_of([element(text)], 500, 50)]
+
+    # Cut at chunk_size, each next chunk starting chunk_overlap characters back
+    assert chunks == [text[:500], text[450:950], text[900:]]
+
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        chunks_of([element("some text here and there")], 50, 50)
+
+
+def test_chunks_never_cross_pages_or_books():
+    elements = [
+        element("first page text " * 5, page=1),
+        element("more first page text " * 5, page=1),
+        element("second page text " * 5, page=2),
+        element("other book text " * 5, page=2, book="other.pdf"),
+    ]
+
+    chunks = chunks_of(elements, 1000, 0)
+
+    assert [(c["book_id"], c["page_number"]) for c in chunks] == [
+        ("book.pdf", 1),
+        ("book.pdf", 2),
+        ("other.pdf", 2),
+    ]
+    assert "second" not in chunks[0]["content"]
+    assert "more first page" in chunks[0]["content"]
+
+
+def test_short_elements_are_skipped_and_counted():
+    stats = {"skipped_short": 0, "total_chunks_created": 0}
+    elements = [element("tiny"), element("long enough element text " * 3)]
+
+    chunks = chunks_of(elements, stats=stats)
+
+    assert stats == {"skipped_short": 1, "total_chunks_created": len(chunks)}
+    assert "tiny" not in chunks[0]["content"]
+
+
+def legacy_clean(text):
+    """Previous ingestion: one re.sub per pattern, then normalize whitespace."""
+    for pattern in HEADER_PATTERNS + FOOTER_PATTERNS:
+        text = re.sub(pattern, "", text, flags=re.MULTILINE | re.IGNORECASE)
+    return " ".join(text.split()).lower()
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Chapter 2: Foundation Models\nModels learn from data.\n42",
+        "AI Engineering by someone\nBody text here.\nPage 17",
+        "Body line one\n  12  \nBody line two\npage 3",
+        "A chapter 2 mention mid-line stays\nas does page 5 of the text",
+        "CHAPTER 10 Evaluation\nai engineering\n\n7\nReal content.",
+    ],
+)
+def test_header_footer_removal_matches_legacy_re_sub(text):
+    pattern = compile_line_patterns(HEADER_PATTERNS + FOOTER_PATTERNS)
+
+    assert clean_element(text, pattern) == legacy_clean(text)
+
+
+def test_no_patterns_keeps_every_line():
+    assert compile_line_patterns([]) is None
+    assert clean_element("Chapter 1\n  Text  HERE ", None) == "chapter 1 text here"
@@ -0,0 +1,294 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class InsertCursor:
+    """Accepts inserts except content containing "bad"."""
+
+    def __init__(self):
+        self.statements = []
+        self.next_id = 1
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.statements.append(sql)
+        if sql.startswith("INSERT INTO document ") and "bad" in params[0]:
+            raise ValueError("invalid byte sequence")
+
+    def fetchone(self):
+        self.next_id += 1
+        return (self.next_id - 1,)
+
+
+@pytest.fixture
+def no_projection(ops, monkeypatch):
+    monkeypatch.setattr(ops, "current_projection", lambda cursor, lock=False: None)
+
+
+def test_failed_row_only_rolls_back_its_savepoint(ops, no_projection):
+    conn, cursor = RecordingConnection(), InsertCursor()
+    contents = ["first good chunk", "a bad chunk", "second good chunk"]
+
+    successful, failed = ops.insert_documents(
+        contents, conn, cursor, ops.model, commit=False, silent=True
+    )
+
+    assert (successful, failed) == (2, 1)
+    assert conn.rollbacks == 0 and conn.commits == 0
+    assert cursor.statements.count("ROLLBACK TO SAVEPOINT insert_document") == 1
+    assert cursor.statements.count("RELEASE SAVEPOINT insert_document") == 2
+
+
+def test_committing_insert_rolls_back_its_own_transaction(ops, no_projection):
+    conn, cursor = RecordingConnection(), InsertCursor()
+
+    assert not ops.insert_document("a bad chunk", conn, cursor, ops.model, silent=True)
+    assert conn.rollbacks == 1
+    assert not any("SAVEPOINT" in sql for sql in cursor.statements)
+
+
+class QueryCursor:
+    """Records (sql, params) and returns no rows."""
+
+    def __init__(self):
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        assert sql.count("%s") == len(params or ()), sql
+        self.queries.append((sql, params))
+
+    def fetchall(self):
+        return []
+
+
+@pytest.fixture
+def coarse(ops, monkeypatch):
+    from models.projection import Projection
+
+    cursor = QueryCursor()
+    projection = Projection.fit(np.eye(16), 4, method="truncate")
+    monkeypatch.setattr(ops, "cursor", cursor)
+    monkeypatch.setattr(ops, "current_projection", lambda cursor: projection)
+    return cursor
+
+
+def search_sql(cursor):
+    return [sql for sql, _ in cursor.queries if sql.startswith(("SELECT", "WITH"))]
+
+
+def test_coarse_stage_pool_is_clamped_to_ef_search(ops, coarse):
+    ops._semantic_search(np.ones(16).tolist(), 200, 0.4, {}, coarse_factor=10)
+
+    assert coarse.queries[0] == ("SET hnsw.ef_search = %s", (ops.MAX_EF_SEARCH,))
+    sql, params = coarse.queries[1]
+    assert "coarse_embedding IS NULL" in sql  # rows without coarse vectors
+    assert params[1] == ops.MAX_EF_SEARCH
+
+
+@pytest.mark.parametrize(
+    "filters, limit, factor",
+    [
+        ({"source": ["a.pdf"]}, 20, 10),  # post-filtered HNSW would starve
+        ({}, 20, 0),  # disabled
+        ({}, 1000, 10),  # pool could not exceed the limit
+    ],
+)
+def test_exact_scan_without_useful_coarse_pool(ops, coarse, filters, limit, factor):
+    ops._semantic_search(np.ones(16).tolist(), limit, 0.4, filters, factor)
+
+    (sql,) = search_sql(coarse)
+    assert "coarse_embedding" not in sql
+    assert not any(sql.startswith("SET") for sql, _ in coarse.queries)
+
+
+class ProjectionCursor(InsertCursor):
+    """Inserts, plus an embedding_projection row another process can refit."""
+
+    def __init__(self, projection):
+        super().__init__()
+        self.fitted_at = datetime(2025, 1, 1)
+        self.projection = projection
+        self.loads = 0
+        self.result = None
+        self.params = []
+
+    def refit(self, projection):
+        self.fitted_at += timedelta(hours=1)
+        self.projection = projection
+
+    def execute(self, sql, params=None):
+        super().execute(sql, params)
+        self.params.append(params)
+        sql = self.statements[-1]
+        if sql.startswith("SELECT fitted_at FROM embedding_projection"):
+            self.result = (self.fitted_at,)
+        elif sql.startswith("SELECT method, dims, mean, components"):
+            self.loads += 1
+            self.result = (
+                self.projection.method,
+                self.projection.dims,
+                *self.projection.to_bytes(),
+            )
+        else:
+            self.result = None
+
+    def fetchone(self):
+        return self.result or super().fetchone()
+
+
+@pytest.fixture
+def fitted_projection(ops, monkeypatch):
+    monkeypatch.setattr(ops, "projection", None)
+    monkeypatch.setattr(ops, "_projection_fitted_at", None)
+
+
+def test_writes_follow_a_refit_by_another_process(ops, fitted_projection):
+    from models.projection import Projection
+
+    first = Projection.fit(np.eye(16), 4, method="truncate")
+    cursor = ProjectionCursor(first)
+    conn = RecordingConnection()
+    assert ops.insert_document(
+        "first chunk", conn, cursor, ops.model, commit=False, silent=True
+    )
+    assert ops.insert_document(
+        "second chunk", conn, cursor, ops.model, commit=False, silent=True
+    )
+    assert cursor.loads == 1  # unchanged fitted_at: no reload
+
+    # Another process refits with a different dimension
+    cursor.refit(Projection.fit(np.eye(16), 8, method="truncate"))
+    assert ops.insert_document(
+        "third chunk", conn, cursor, ops.model, commit=False, silent=True
+    )
+
+    assert cursor.loads == 2
+    (coarse,) = [
+        params[2]
+        for sql, params in zip(cursor.statements, cursor.params)
+        if "coarse_embedding" in sql
+    ][-1:]
+    assert len(coarse) == 8
+    # Writers hold the projection row so a refit waits for their transaction
+    checks = [sql for sql in cursor.statements if "fitted_at" in sql]
+    assert len(checks) == 3 and all(sql.endswith("FOR SHARE") for sql in checks)
+
+
+def test_search_reads_the_current_projection(ops, fitted_projection, monkeypatch):
+    from models.projection import Projection
+
+    cursor = ProjectionCursor(Projection.fit(np.eye(16), 4, method="truncate"))
+    cursor.fetchall = lambda: []
+    monkeypatch.setattr(ops, "cursor", cursor)
+    ops._semantic_search(np.ones(16).tolist(), 10, 0.4, {}, coarse_factor=10)
+    cursor.refit(Projection.fit(np.eye(16), 8, method="truncate"))
+    ops._semantic_search(np.ones(16).tolist(), 10, 0.4, {}, coarse_factor=10)
+
+    coarse_vectors = [
+        params[0]
+        for sql, params in zip(cursor.statements, cursor.params)
+        if "ORDER BY e.coarse_embedding" in sql
+    ]
+    assert [len(v.strip("[]").split(",")) for v in coarse_vectors] == [4, 8]
+    assert cursor.loads == 2
+
+
+class SignatureCursor:
+    def __init__(self, rows):
+        self.rows = rows  # (id, minhash bytes or None, content)
+
+    def execute(self, sql, params=None):
+        assert "CASE WHEN minhash IS NULL THEN content END" in sql
+
+    def fetchall(self):
+        return [
+            (doc_id, data, content if data is None else None)
+            for doc_id, data, content in self.rows
+        ]
+
+
+def test_minhash_index_signs_rows_missing_a_signature(ops):
+    from utils import minhash
+
+    boilerplate = "all rights reserved no part of this book may be reproduced"
+    stored = minhash.to_bytes(minhash.signature("an unrelated stored chunk of text"))
+    index = ops.load_minhash_index(
+        SignatureCursor([(1, stored, None), (2, None, boilerplate)])
+    )
+
+    assert len(index) == 2
+    assert index.find_duplicate(minhash.signature(boilerplate)) == 2
+
+
+class FailingEmbedder:
+    """Fails to encode any batch containing "bad"."""
+
+    def encode(self, texts):
+        if any("bad" in text for text in texts):
+            raise RuntimeError("worker died")
+        return np.ones((len(texts), 16))
+
+
+def test_failed_encode_counts_its_batch_as_failed(ops, no_projection):
+    conn, cursor = RecordingConnection(), InsertCursor()
+    contents = ["first chunk", "second chunk", "a bad chunk", "third chunk", "last"]
+
+    successful, failed = ops.insert_documents(
+        contents,
+        conn,
+        cursor,
+        FailingEmbedder(),
+        commit=False,
+        batch_size=2,
+        silent=True,
+    )
+
+    # The second batch never reaches the database; the others stay queued
+    assert (successful, failed) == (3, 2)
+    assert conn.commits == 0 and conn.rollbacks == 0
+    inserted = [
+        sql for sql in cursor.statements if sql.startswith("INSERT INTO document ")
+    ]
+    assert len(inserted) == 3
+
+
+class SchemaConnection(RecordingConnection):
+    def __init__(self, cursor):
+        super().__init__()
+        self.autocommit = False
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def test_connect_checks_the_schema_without_backfilling(ops, monkeypatch):
+    from test_schema import CatalogCursor, everything
+
+    cursor = CatalogCursor(everything())
+    conn = SchemaConnection(cursor)
+    monkeypatch.setattr(ops, "conn", None)
+    monkeypatch.setattr(ops, "cursor", None)
+    monkeypatch.setattr(ops, "db_connection", lambda: conn)
+
+    assert ops.connect() is cursor
+    assert ops.connect() is cursor  # once per process
+
+    # Catalog checks only: backfills are a separate maintenance step
+    assert cursor.statements == []
+    assert conn.autocommit and conn.commits == 1
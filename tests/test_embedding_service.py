@@ -0,0 +1,30 @@
+import models.embedding_service as embedding_service
+from models.embedding_service import EmbeddingService, length_batches
+
+from conftest import HashEmbedder
+
+
+def test_length_batches_cover_every_text_once():
+    texts = [" ".join(["w"] * n) for n in (3, 40, 5, 17, 3, 90, 16, 1)]
+
+    batches = length_batches(texts, batch_size=2, bucket_width=16)
+
+    positions = [p for batch_positions, _ in batches for p in batch_positions]
+    assert sorted(positions) == list(range(len(texts)))
+    for batch_positions, batch in batches:
+        assert len(batch) <= 2
+        assert batch == [texts[p] for p in batch_positions]
+        # A batch never spans two length buckets
+        assert len({len(text.split()) // 16 for text in batch}) == 1
+
+
+def test_single_process_encode_keeps_input_order(monkeypatch):
+    monkeypatch.setattr(embedding_service, "get_embedder", lambda name: HashEmbedder())
+    texts = ["a much longer sentence than the others here", "short", "mid size text"]
+
+    with EmbeddingService(num_workers=1) as service:
+        service.wait_ready()  # nothing to wait for in-process
+        vectors = service.encode(texts)
+
+    expected = HashEmbedder().encode(texts)
+    assert [list(v) for v in vectors] == [list(v) for v in expected]
@@ -0,0 +1,75 @@
+from db import schema
+
+
+class RecordingConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class CatalogCursor:
+    """Answers the catalog checks from a set of existing columns/relations."""
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.statements = []
+        self.result = None
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        if sql.startswith("SELECT to_regclass"):
+            self.result = (params[0] not in self.existing,)
+        elif "information_schema.columns" in sql:
+            self.result = (params not in self.existing,)
+        else:
+            self.statements.append((sql, params))
+
+    def fetchone(self):
+        return self.result
+
+
+def everything():
+    return {
+        (relation, column) if column else relation
+        for relation, column, _ in schema.SCHEMA_UPDATES
+    }
+
+
+def test_up_to_date_schema_takes_no_lock():
+    conn, cursor = RecordingConnection(), CatalogCursor(everything())
+
+    assert schema.ensure_schema(conn, cursor)
+
+    assert cursor.statements == []
+    assert conn.commits == 1  # ends the catalog reads' transaction
+
+
+def test_only_missing_updates_run_under_a_lock_timeout():
+    existing = everything() - {("document", "minhash"), "idx_document_minhash_missing"}
+    conn, cursor = RecordingConnection(), CatalogCursor(existing)
+
+    assert schema.ensure_schema(conn, cursor)
+
+    assert cursor.statements[0] == (
+        "SET LOCAL lock_timeout = %s",
+        (schema.SCHEMA_LOCK_TIMEOUT,),
+    )
+    assert [sql.split()[0] for sql, _ in cursor.statements[1:]] == ["ALTER", "CREATE"]
+    assert "minhash BYTEA" in cursor.statements[1][0]
+    assert conn.commits == 1
+
+
+def test_migration_command_waits_for_locks():
+    existing = everything() - {("document", "updated_at")}
+    conn, cursor = RecordingConnection(), CatalogCursor(existing)
+
+    assert schema.ensure_schema(conn, cursor, lock_timeout=None)
+
+    assert len(cursor.statements) == 1
+    assert "updated_at" in cursor.statements[0][0]
@@ -0,0 +1,134 @@
+import io
+import json
+import sys
+from datetime import date, datetime
+
+import pytest
+from rich.text import Text
+
+# database_operations renders through core.utils (a separate module object)
+import core.utils.rich_console as rich_console
+from utils.jsonl_output import to_jsonl, write_jsonl
+from core.utils.rich_console import highlight_query, query_terms
+
+
+def highlighted(text):
+    return [text.plain[span.start : span.end] for span in text.spans]
+
+
+def test_highlight_matches_whole_normalized_tokens():
+    text = highlight_query("Running tests; the TESTS rerun. Testing", "tests running")
+
+    # Case-insensitive, whole tokens only: "rerun" and "Testing" stay plain
+    assert highlighted(text) == ["Running", "tests", "TESTS"]
+    assert all(span.style == "bold yellow" for span in text.spans)
+
+
+def test_highlight_reuses_a_term_set_and_keeps_existing_styles():
+    terms = query_terms("attention")
+    assert terms == frozenset({"attention"})
+
+    styled = Text("attention heads")
+    styled.stylize("italic", 10, 15)
+    text = highlight_query(styled, terms=terms)
+
+    assert text is styled
+    assert highlighted(text) == ["heads", "attention"]
+    assert highlighted(highlight_query("no match here", terms=terms)) == []
+    assert highlighted(highlight_query("attention", "")) == []
+
+
+def result(doc_id, content="some content", language="en"):
+    return {
+        "id": doc_id,
+        "content": content,
+        "score": 0.5,
+        "language": language,
+        "created_at": datetime(2025, 1, 31, 12, 30),
+        "book_id": "a.pdf",
+        "page_number": 1,
+    }
+
+
+@pytest.fixture
+def printed_tables(monkeypatch):
+    tables = []
+    monkeypatch.setattr(rich_console.console, "print", tables.append)
+    return tables
+
+
+def test_max_rows_only_formats_the_rows_shown(printed_tables, monkeypatch):
+    cleaned = []
+    clean_text = rich_console.clean_text
+    monkeypatch.setattr(
+        rich_console,
+        "clean_text",
+        lambda text: cleaned.append(text) or clean_text(text),
+    )
+    results = [result(i, f"row number {i}") for i in range(10)]
+
+    rich_console.display_results(results, query="row", max_rows=3)
+
+    (table,) = printed_tables
+    assert table.row_count == 3
+    assert cleaned == ["row number 0", "row number 1", "row number 2"]
+
+
+def test_render_response_passes_max_rows(ops, printed_tables, capsys):
+    response = {
+        "query": "row",
+        "results": [result(i) for i in range(5)],
+        "semantic_count": 5,
+        "bm25_count": 0,
+        "elapsed": 0.01,
+    }
+
+    ops.render_response(response, max_rows=2)
+    assert printed_tables[0].row_count == 2
+    ops.render_response(response)
+    assert printed_tables[1].row_count == 5
+    assert "5 results shown" in capsys.readouterr().out
+
+
+def test_jsonl_serializes_dates_and_keeps_unicode():
+    response = {
+        "query": "سلام",
+        "results": [{**result(1), "created_at": datetime(2025, 1, 31, 12, 30)}],
+        "day": date(2025, 1, 31),
+        "error": ValueError("bad filter"),
+    }
+    stream = io.StringIO()
+
+    write_jsonl(response, stream)
+
+    line = stream.getvalue()
+    assert line.endswith("\n") and line.count("\n") == 1
+    decoded = json.loads(line)
+    assert decoded["query"] == "سلام" and "سلام" in line
+    assert decoded["results"][0]["created_at"] == "2025-01-31T12:30:00"
+    assert decoded["day"] == "2025-01-31"
+    assert decoded["error"] == "bad filter"
+    assert to_jsonl(response) == line[:-1]
+
+
+def test_bulk_search_writes_one_line_per_query_with_errors(
+    ops, tmp_path, capsys, monkeypatch
+):
+    import bulk_search
+
+    queries = tmp_path / "queries.txt"
+    queries.write_text("first query\n\n   \nsecond query\n", encoding="utf-8")
+    monkeypatch.setattr(sys, "argv", ["bulk_search.py", str(queries), "--top-k", "3"])
+
+    # No database in tests: every query fails, still one JSON line each
+    bulk_search.main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line)["query"] for line in lines] == [
+        "first query",
+        "second query",
+    ]
+    for line in lines:
+        response = json.loads(line)
+        assert response["results"] == [] and response["error"]
+        assert isinstance(response["elapsed"], float)
@@ -0,0 +1,88 @@
+import pytest
+
+from core.utils.tokenizer import iter_token_spans, normalize_token, tokenize
+
+
+@pytest.mark.parametrize(
+    "arabic, persian",
+    [
+        ("علي", "علی"),  # ي -> ی
+        ("مصطفى", "مصطفی"),  # ى -> ی
+        ("كتاب", "کتاب"),  # ك -> ک
+        ("مدرسة", "مدرسه"),  # ة -> ه
+        ("أحمد", "احمد"),  # hamza forms of alef
+        ("إسلام", "اسلام"),
+        ("آب", "اب"),
+    ],
+)
+def test_arabic_and_persian_letter_variants_fold_together(arabic, persian):
+    assert tokenize(arabic) == tokenize(persian)
+
+
+def test_diacritics_and_tatweel_are_stripped():
+    assert tokenize("كِتَابٌ") == tokenize("کتاب")
+    assert tokenize("كـــتاب") == tokenize("کتاب")
+
+
+def test_zwnj_joins_persian_compounds():
+    assert tokenize("می‌خواهم") == ["میخواهم"]
+    assert tokenize("کتاب‌ها") == tokenize("کتابها")
+
+
+def test_persian_and_arabic_digits_fold_to_ascii():
+    assert tokenize("۱۴۰۲") == ["1402"]
+    assert tokenize("٢٠٢٤") == ["2024"]
+    assert tokenize("صفحه ۱۲") == tokenize("صفحه 12")
+
+
+def test_latin_text_is_lowercased_and_punctuation_dropped():
+    assert tokenize("Hello, World! BM25-index.") == ["hello", "world", "bm25", "index"]
+    assert normalize_token("Ünïcode") == "ünïcode"
+
+
+def test_empty_input():
+    assert tokenize("") == []
+    assert tokenize(None) == []
+    assert list(iter_token_spans("")) == []
+
+
+@pytest.mark.parametrize(
+    "language, text, kept",
+    [
+        ("en", "the model of the year", ["model", "year"]),
+        ("fa", "این کتاب در کتابخانه است", ["کتاب", "کتابخانه"]),
+        # Stopword lists are folded too: Arabic-keyboard spellings match
+        ("ar", "هذا الكتاب في المكتبة", ["الکتاب", "المکتبه"]),
+        ("id", "buku ini untuk anak", ["buku", "anak"]),
+    ],
+)
+def test_stopwords_are_removed_per_language(language, text, kept):
+    assert tokenize(text, language, remove_stopwords=True) == kept
+
+
+def test_stopwords_are_kept_without_a_known_language():
+    text = "the model of the year"
+    assert tokenize(text, remove_stopwords=True) == tokenize(text)
+    assert tokenize(text, "xx", remove_stopwords=True) == tokenize(text)
+    assert tokenize(text, "en") == tokenize(text)
+    # Another language's list does not apply
+    assert tokenize(text, "fa", remove_stopwords=True) == tokenize(text)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Hello, World! BM25-index.",
+        "كِتَابٌ جديد في المكتبة",
+        "می‌خواهم کتاب‌ها را بخوانم",
+        "سال ۱۴۰۲ و ٢٠٢٤ and 2025",
+        "mixed متن with English كلمات",
+        "tatweel كـــتاب",
+    ],
+)
+def test_token_spans_match_tokenize(text):
+    spans = list(iter_token_spans(text))
+
+    assert [token for token, _, _ in spans] == tokenize(text)
+    for token, start, end in spans:
+        assert normalize_token(text[start:end]) == token